@@ -1,35 +1,81 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import wraps
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import numpy as np
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
-from PIL import Image
 
-# =============================
-# PLOTLY GLOBAL STYLE
-# =============================
-PLOTLY_LAYOUT = dict(
-    height=420,
-    margin=dict(l=40, r=40, t=60, b=40),
-    paper_bgcolor="rgba(0,0,0,0)",
-    plot_bgcolor="rgba(0,0,0,0)",
-    font=dict(
-        family="Segoe UI",
-        size=13,
-        color="#1e293b"
-    ),
-    title=dict(
-        font=dict(size=18, color="#15264d")
-    )
+from charts import (
+    age_figure,
+    category_figure,
+    dashboard_scatter_figure,
+    home_age_figure,
+    home_category_figure,
+    home_map_figure,
+    home_scatter_figure,
+    home_trend_figure,
+    map_figure,
+    trend_figure,
+)
+from sales_engine import (
+    BASE_CURRENCY,
+    DATA_PATH,
+    EXPORT_FORMATS,
+    PARQUET_SOURCE,
+    PARTITION_DIR,
+    PERF_DIR,
+    PERF_JSONL_PATH,
+    PERF_PROM_PATH,
+    QUERY_BACKEND,
+    SCATTER_METHODS,
+    SCATTER_REDUCE_ROWS,
+    SCATTER_SAMPLE_SIZE,
+    SCATTER_WEBGL_ROWS,
+    DatasetStore,
+    DuckDBStore,
+    PerfLaps,
+    build_partitions,
+    currency_symbol,
+    dashboard_results,
+    detect_column,
+    duckdb,
+    home_results,
+    json_value,
+    load_exchange_rates,
+    pa_ds,
+    parquet_files,
+    perf,
+    perf_active,
+    perf_begin,
+    perf_filters,
+    perf_finish,
+    perf_stage,
+    pq,
+    range_totals,
+    table_positions,
+    write_export,
 )
 
-COLOR_PALETTE = [
-    "#5b5dd8",
-    "#6366f1",
-    "#7dd3fc",
-    "#22c55e",
-    "#f59e0b",
-    "#ef4444"
-]
+# ============ PARTITION BUILD ============ #
+#   python app.py --build-partitions [directory]
+if __name__ == "__main__" and "--build-partitions" in sys.argv and not st.runtime.exists():
+    args = sys.argv[sys.argv.index("--build-partitions") + 1:]
+    root = args[0] if args else PARTITION_DIR
+    # The store checks the snapshot against the CSV before building from it
+    print(f"Wrote {build_partitions(DatasetStore(DATA_PATH).get().df, root)} partition files to {root}")
+    sys.exit(0)
 
 # =============================
 # PAGE CONFIG
@@ -40,535 +86,518 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ============ PERFORMANCE TIMING ============ #
+# The recorder and stage timers live in sales_engine; every script run is
+# timed as one rerun, opened here and finished by the router.
+perf_begin(st.session_state.get("page", "Dashboard"))
+
+
+# Wraps a page fragment whose first argument is the dataset. During a full
+# run it just runs; when only the fragment reruns it is timed as a rerun.
+def perf_fragment(body):
+    @wraps(body)
+    def fragment(dataset, *args, **kwargs):
+        ctx = get_script_run_ctx()
+        run = perf_active.get()
+        # A full run left open by an exception is stale; nested fragments share the outer rerun
+        if ctx is None or not ctx.fragment_ids_this_run or (run is not None and run["fragment"]):
+            return body(dataset, *args, **kwargs)
+        page = st.session_state.get("page", "Dashboard")
+        run = perf_begin(page, fragment=body.__name__)
+        try:
+            with profile_rerun("fragment", page, dataset.version):
+                return body(dataset, *args, **kwargs)
+        finally:
+            perf_finish(run, dataset.version)
+    return st.fragment(fragment)
+
+# ============ PROFILER ============ #
+# The next full rerun or the next fragment rerun (a filter change) can be
+# captured by a sampling profiler and saved as a speedscope file (open it at
+# https://www.speedscope.app). Armed from Settings or with
+# ?profile=<VELOCIA_PROFILE_TOKEN>[&profile_scope=fragment] on the URL; both
+# need the token, so profiling is off unless it is configured.
+PROFILE_DIR = os.path.join(PERF_DIR, "profiles")
+PROFILE_TOKEN = os.environ.get("VELOCIA_PROFILE_TOKEN")
+PROFILE_INTERVAL = 0.002
+PROFILE_SCOPES = {"off": "Off", "rerun": "Next page rerun", "fragment": "Next filter change"}
+
+if "profile_next" not in st.session_state:
+    st.session_state.profile_next = "off"
+# Keeps the Settings choice while other pages are shown
+st.session_state.profile_next = st.session_state.profile_next
+
+
+class StackSampler:
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = []
+        self.frame_ids = {}
+        self.samples = []
+        self.weights = []
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+
+    def frame_id(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frame_ids:
+            self.frame_ids[key] = len(self.frames)
+            self.frames.append({"name": key[0], "file": key[1], "line": key[2]})
+        return self.frame_ids[key]
+
+    def run(self):
+        last = self.started
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_id(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples.append(stack[::-1])
+                self.weights.append(now - last)
+            last = now
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        self.thread.join()
+        return time.perf_counter() - self.started
+
+
+def profile_requested(scope):
+    if PROFILE_TOKEN and st.query_params.get("profile") == PROFILE_TOKEN:
+        armed = st.query_params.get("profile_scope", "rerun")
+        del st.query_params["profile"]
+        st.query_params.pop("profile_scope", None)
+        st.session_state.profile_next = armed if armed in PROFILE_SCOPES else "rerun"
+    # The Settings rerun that arms the profiler is not the one to capture
+    if st.session_state.profile_next == scope and st.session_state.page != "Settings":
+        st.session_state.profile_next = "off"
+        return True
+    return False
+
+
+def save_profile(sampler, seconds, page, filters, version):
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    tag = hashlib.sha1(json.dumps(filters, sort_keys=True, default=json_value).encode()).hexdigest()[:8]
+    name = f"{page} · v{version} · " + ", ".join(f"{key}={value}" for key, value in filters.items())
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{stamp}-{re.sub(r'[^A-Za-z0-9]+', '-', page)}-v{version}-{tag}.speedscope.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "velocia",
+            "shared": {"frames": sampler.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": seconds,
+                "samples": sampler.samples,
+                "weights": sampler.weights,
+            }],
+        }, f)
+    with open(os.path.join(PROFILE_DIR, "index.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "time": stamp,
+            "file": os.path.basename(path),
+            "page": page,
+            "version": version,
+            "filters": filters,
+            "seconds": round(seconds, 6),
+            "samples": len(sampler.samples),
+        }, default=json_value) + "\n")
+    return path
+
+
+@contextmanager
+def profile_rerun(scope, page, version):
+    sampler = StackSampler(threading.get_ident()).start() if profile_requested(scope) else None
+    try:
+        yield
+    finally:
+        if sampler is not None:
+            seconds = sampler.stop()
+            run = perf_active.get()
+            path = save_profile(sampler, seconds, page, run["filters"] if run else {}, version)
+            st.toast(f"🔬 Profile saved to {path}")
+
 # =============================
 # CUSTOM STYLE
 # =============================
-st.markdown("""
-<style>
-/* ===============================
-GLOBAL APP
-=============================== */
-.stApp {
-    background: linear-gradient(135deg, #5b5dd8, #cad5f9,#abcaf7);
-    font-family: 'Segoe UI', sans-serif;
-    color: #1e293b;
-}
-.block-container {
-    padding: 2.5rem 3rem;
-}
-
-/* ===============================
-SIDEBAR
-=============================== */
-section[data-testid="stSidebar"] {
-    background: linear-gradient(120deg, #5b5dd8,#6062f0, #a19df7);
-    box-shadow: 8px 0 30px rgba(79,70,229,0.35);
-}
-section[data-testid="stSidebar"] * {
-    color: white !important;
-    font-weight: 500;
-}
-
-/* ===============================
-HEADER
-=============================== */
-.header {
-    background: linear-gradient(90deg, #6365e8, #8498ff,#97a8ff, #7dd3fc);
-    padding: 35px;
-    border-radius: 28px;
-    font-size: 36px;
-    font-weight: 700;
-    text-align: center;
-    margin-bottom: 20px;
-    color: #15264d;
-    box-shadow:
-        0 45px 45px rgba(99,102,241,0.35),
-        inset 0 1px 0 rgba(255,255,255,0.6);
-}
-.header {
-    margin-top: 20px;
-    margin-bottom: 20px;
-    padding: 22px 28px;
-}
-.header {
-    margin-top: 20px;
-    padding: 20px 32px;
-    border-radius: 28px;
-}
-
-/* ===============================
-KPI CARD
-=============================== */
-[data-testid="metric-container"] {
-    background: linear-gradient(180deg, #6365e8, #8498ff,#97a8ff, #7dd3fc);
-    border-radius: 22px;
-    padding: 22px;
-    box-shadow:
-        0 12px 30px rgba(99,102,241,0.25);
-    backdrop-filter: blur(50px);
-    text-align: center;
-}
-[data-testid="metric-container"] label {
-    font-size: 18px;
-    color: #2f4768;
-}
-[data-testid="metric-container"] div {
-    font-size: 30px;
-    font-weight: 700;
-    color: #15264d;
-}
-
-/* ===============================
-FILTER (SELECTBOX)
-=============================== */
-div[data-baseweb="select"] > div {
-    background: rgba(255,255,255,0.6) !important;
-    border-radius: 18px !important;
-    border: none !important;
-    box-shadow:
-        0 8px 22px rgba(99,102,241,0.25);
-    backdrop-filter: blur(12px);
-}
-div[data-baseweb="select"] span {
-    color: #1e293b !important;
-    font-weight: 500;
-}
-
-/* ===============================
-CHART CONTAINER
-=============================== */
-.stPlotlyChart {
-    background: rgba(255,255,255,0.55);
-    border-radius: 26px;
-    padding: 22px;
-    box-shadow:
-        0 18px 40px rgba(99,102,241,0.28);
-    backdrop-filter: blur(14px);
-    margin-bottom: 35px;
-}
-
-/* ===============================
-TABLE
-=============================== */
-.stDataFrame {
-    background: rgba(255,255,255,0.6);
-    border-radius: 22px;
-    box-shadow: 0 12px 30px rgba(99,102,241,0.25);
-}
-
-/* ===============================
-BUTTON
-=============================== */
-.stButton > button {
-    background: linear-gradient(90deg, #818cf8, #7dd3fc);
-    color: #0f172a;
-    border-radius: 20px;
-    font-weight: 600;
-    padding: 10px 22px;
-    box-shadow: 0 10px 25px rgba(99,102,241,0.35);
-}
-.stButton > button:hover {
-    transform: translateY(-2px);
-}
-
-/* ===============================
-INPUT & TEXTAREA
-=============================== */
-.stTextInput input,
-.stTextArea textarea,
-.stDateInput input {
-    background: rgba(255,255,255,0.6);
-    border-radius: 16px;
-    border: none;
-}
-.kpi-animated {
-    background: linear-gradient(200deg,#f6d5ff,#97a8ff, #7dd3fc);
-    border-radius: 22px;
-    padding: 22px;
-    text-align: center;
-    box-shadow: 0 50px 65px rgba(99,102,241,0.28);
-    backdrop-filter: blur(14px);
-    border: 1.5px solid rgba(255, 255, 255, 0.55);
-}
-.kpi-label {
-    border-radius: 20px;
-    font-size: 18px;
-    color: #1e293b;
-    margin-bottom: 6px;
-}
-.kpi-value {
-    font-size: 30px;
-    font-weight: 700;
-    color: #1e293b;
-}    
-section[data-testid="stSidebar"] .stSelectbox {
-    margin-top: 10px;
-}
-            
-/* ===============================
-DASHBOARD SPACING FIX
-=============================== */
-/* MAIN CONTENT WIDTH */
-.block-container {
-    padding-top: 2.5rem !important;
-    padding-bottom: 3rem !important;
-}
-/* HEADER SPACING */
-.header {
-    margin-bottom: 25px !important;
-}
-/* FILTER ROW */
-div[data-testid="stHorizontalBlock"]:has(select) {
-    margin-bottom: 40px !important;
-}
-/* FILTER SELECTBOX SPACING */
-section[data-testid="stSidebar"] + div select,
-.stSelectbox {
-    margin-bottom: 5px;
-}
-/* KPI ROW SPACING */
-div[data-testid="stHorizontalBlock"]:has(.kpi-animated) {
-    margin-bottom: 15px !important;
-}
-/* KPI CARD SIZE CONSISTENCY */
-.kpi-animated {
-    min-height: 90px;
-    display: flex;
-    flex-direction: column;
-    justify-content: center;
-}
-/* CHART CONTAINER SPACING */
-.stPlotlyChart {
-    margin-top: 10px !important;
-    margin-bottom: 50px !important;
-}
-/* CHART TITLE SPACING */
-.stPlotlyChart h2 {
-    margin-bottom: 18px !important;
-}
-/* DATAFRAME SPACING */
-.stDataFrame {
-    margin-top: 20px !important;
-}
-/* GLOBAL SECTION GAP */
-section.main > div {
-    gap: 28px;
-}
-/* INSIGHT MESSAGE SPACING */
-.stAlert {
-    margin-top: 5px;
-    margin-bottom: 10px;
-}
-/* SIDEBAR ACCORDION */
-section[data-testid="stSidebar"] .stExpander {
-    background: rgba(255,255,255,0.15);
-    border-radius: 16px;
-    margin-bottom: 12px;
-}
-section[data-testid="stSidebar"] .stExpander > details {
-    padding: 6px 12px;
-}
-section[data-testid="stSidebar"] button {
-    width: 100%;
-    text-align: left;
-    background: transparent;
-    border: none;
-    padding: 10px 8px;
-    border-radius: 10px;
-}
-section[data-testid="stSidebar"] button:hover {
-    background: rgba(255,255,255,0.18);
-}
-/* STICKY FILTER */
-.sticky-filter {
-    position: sticky;
-    top: 15px;
-    z-index: 99;
-    padding: 18px 20px;
-    margin-bottom: 40px;
-    background: rgba(255,255,255,0.65);
-    backdrop-filter: blur(16px);
-    border-radius: 26px;
-    box-shadow: 0 18px 40px rgba(99,102,241,0.25);
-}
-/* FADE ANIMATION */
-.fade-in {
-    animation: fadeUp 0.8s ease-in-out both;
-}
-@keyframes fadeUp {
-    from {
-        opacity: 0;
-        transform: translateY(25px);
-    }
-    to {
-        opacity: 1;
-        transform: translateY(0);
-    }
-}
+STYLESHEETS = [
+    "assets/css/app.css",
+    "assets/css/sidebar.css",
+    "assets/css/home.css",
+]
+STATIC_DIR = "static"
+LOGO_PATH = "assets/velocia_logo.png"
 
-/* ===============================
-ACTIVE SIDEBAR
-=============================== */       
-section[data-testid="stSidebar"] button[aria-selected="true"] {
-    background: rgba(255,255,255,0.18) !important; 
-    backdrop-filter: blur(8px);
 
-    color: #ffffff !important;
-    font-weight: 700;
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};,>])\s*", r"\1", css).strip()
 
-    box-shadow:
-        inset 4px 0 0 rgba(255,255,255,0.5),
-        0 8px 22px rgba(0,0,0,0.15);
 
-    opacity: 1 !important;
-}
+# Built once per stylesheet change: minified, content-hashed and written to
+# the static folder so browsers cache it instead of receiving it every rerun.
+@st.cache_resource
+def build_stylesheet(mtimes):
+    raw = "\n".join(open(path, encoding="utf-8").read() for path in STYLESHEETS)
+    css = minify_css(raw)
+    name = f"velocia.{hashlib.sha256(css.encode()).hexdigest()[:12]}.css"
+    target = os.path.join(STATIC_DIR, name)
+    try:
+        if not os.path.exists(target):
+            os.makedirs(STATIC_DIR, exist_ok=True)
+            with open(target + ".tmp", "w", encoding="utf-8") as f:
+                f.write(css)
+            os.replace(target + ".tmp", target)
+        served = True
+    except OSError:
+        served = False
+    return {"name": name, "css": css, "raw_bytes": len(raw.encode()), "served": served}
 
-        
-/* ===============================
-PAGE TRANSITION
-=============================== */
-.page-transition {
-    animation: pageFade .6s ease-in-out both;
-}
-
-@keyframes pageFade {
-    from {
-        opacity: 0;
-        transform: translateY(20px);
-    }
-    to {
-        opacity: 1;
-        transform: translateY(0);
-    }
-}
-
-/* ===============================
-SKELETON LOADING KPI
-=============================== */
-.kpi-skeleton {
-    height: 70px;
-    border-radius: 16px;
-    background: linear-gradient(
-        90deg,
-        #e5e7eb 30%,
-        #f3f4f6 40%,
-        #e5e7eb 50%
-    );
-    background-size: 200%;
-    animation: shimmer 1.2s infinite;
-}
-@keyframes shimmer {
-    to {
-        background-position-x: -200%;
-    }
-}
-
-/* ===============================
-MOBILE FIX
-=============================== */
-@media (max-width: 768px) {
-    .block-container {
-        padding: 1.2rem 1rem !important;
-    }
-    .header {
-        font-size: 24px;
-    }
-}
-
-/* ======================================
-SIDEBAR UX 
-====================================== */
-/* DEFAULT SIDEBAR BUTTON */
-section[data-testid="stSidebar"] button {
-    color: #e8f8ff !important;
-    background: transparent !important;
-    border-radius: 14px;
-    margin: 6px 0;
-    padding: 10px 12px;
-    transition: all 0.25s ease;
-}
-/* HOVER STATE */
-section[data-testid="stSidebar"] button:hover {
-    background: rgba(255,255,255,0.18) !important;
-    transform: translateX(4px);
-}
-/* ACTIVE / SELECTED STATE */
-section[data-testid="stSidebar"] button[aria-selected="true"] {
-    background: rgba(255,255,255,0.22) !important;   
-    backdrop-filter: blur(10px);
-    
-    color: #ffffff !important;
-    font-weight: 700;
-
-    box-shadow:
-        inset 4px 0 0 rgba(255,255,255,0.9),
-        0 10px 28px rgba(0,0,0,0.18);
-    transform: translateX(6px);
-}
-/* ICON ACTIVE */
-section[data-testid="stSidebar"] button[aria-selected="true"] svg {
-    fill: #ffffff !important;
-}
-/* ICON HOVER */
-section[data-testid="stSidebar"] button:hover svg {
-    fill: #ffffff !important;
-}
-/* REMOVE FOCUS OUTLINE (CLEAN LOOK) */
-section[data-testid="stSidebar"] button:focus {
-    outline: none !important;
-    box-shadow: none !important;
-}
-
-/* ===============================
-HOME COMPACT MODE
-=============================== */
-.home-compact .block-container {
-    padding-top: 1.4rem !important;
-    padding-bottom: 1.2rem !important;
-}
-/* KPI lebih ramping */
-.home-compact .kpi-animated {
-    min-height: 72px;
-    padding: 14px;
-}
-.home-compact .kpi-value {
-    font-size: 26px;
-}
-.home-compact .kpi-label {
-    font-size: 14px;
-}
-/* Chart container lebih pendek */
-.home-compact .stPlotlyChart {
-    padding: 14px;
-    border-radius: 22px;
-    margin-bottom: 14px !important;
-}
-/* Header lebih tipis */
-.home-compact .header {
-    font-size: 30px;
-    padding: 16px 22px;
-    margin-bottom: 14px !important;
-}
-/* Jarak antar row dipersempit */
-.home-compact section.main > div {
-    gap: 16px;
-}
-
-/* =========================
-HAPUS SCROLLBAR PLOTLY
-========================= */
-/* Wrapper plotly */
-.stPlotlyChart > div {
-    overflow: visible !important;
-}
-/* SVG chart */
-.stPlotlyChart svg {
-    overflow: visible !important;
-}
-/* Container utama chart */
-.js-plotly-plot,
-.plotly,
-.plot-container {
-    overflow: visible !important;
-}
-/* Hilangkan scrollbar internal */
-.js-plotly-plot::-webkit-scrollbar {
-    display: none !important;
-}
-/* Firefox */
-.js-plotly-plot {
-    scrollbar-width: none !important;
-}
-
-/* =========================
-ANTI CARD KE POTONG
-========================= */
-.element-container {
-    overflow: visible !important;
-}
-/* Tambah ruang aman bawah */
-.block-container {
-    padding-bottom: 3rem;
-}
-/* =========================
-HOME COMPACT MODE
-========================= */
-.home-compact {
-    max-height: 100vh;
-    overflow: hidden;
-}
-/* KPI COMPACT */
-.home-compact .kpi-animated {
-    padding: 12px !important;
-    min-height: 80px !important;
-}
-.home-compact .kpi-label {
-    font-size: 14px !important;
-}
-.home-compact .kpi-value {
-    font-size: 22px !important;
-}
-/* CHART COMPACT */
-.home-compact .stPlotlyChart {
-    padding: 12px !important;
-    margin-bottom: 12px !important;
-    border-radius: 18px !important;
-}
-/* REMOVE EXTRA SPACE */
-.home-compact h2 {
-    margin-bottom: 8px !important;
-}
-/* PLOTLY TITLE */
-.home-compact .plotly-title {
-    margin-bottom: 0px !important;
-}
-/* COLUMN GAP */
-.home-compact section.main > div {
-    gap: 14px !important;
-}
-</style>
-""", unsafe_allow_html=True)
+
+def stylesheet_markup():
+    sheet = build_stylesheet(tuple(os.path.getmtime(path) for path in STYLESHEETS))
+    if sheet["served"] and st.get_option("server.enableStaticServing"):
+        return f'<link rel="stylesheet" href="app/static/{sheet["name"]}">'
+    return f"<style>{sheet['css']}</style>"
+
+
+@st.cache_resource
+def load_logo(path=LOGO_PATH):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+st.markdown(stylesheet_markup(), unsafe_allow_html=True)
 
 # ============ LOAD DATA ============ #
-@st.cache_data
-def load_data():
-    df = pd.read_csv("Sales.csv")
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-    return df.dropna(subset=["Date"])
+# Loading, aggregation and queries live in sales_engine; one store per process.
+@st.cache_resource
+def dataset_store():
+    if QUERY_BACKEND == "duckdb" and duckdb is not None:
+        return DuckDBStore(DATA_PATH, PARQUET_SOURCE)
+    return DatasetStore(DATA_PATH)
+
+# Only a cold parse reports progress; snapshot loads and warm reruns stay silent
+loading = st.empty()
+with perf_stage("load"):
+    dataset = dataset_store().get(lambda done, text: loading.progress(done, text=text))
+loading.empty()
+df = dataset.df
+
+# ============ RESULT CACHE ============ #
+# Computed KPIs and chart frames keyed by dataset version and normalized
+# filters, shared by every session. Cached frames are read-only for pages.
+RESULT_CACHE_MAX_MB = 256
+RESULT_CACHE_TTL = 60 * 60
+
+
+def normalize_selection(value):
+    if isinstance(value, list):
+        return tuple(sorted(value))
+    return value
+
+
+def result_size(value):
+    if isinstance(value, dict):
+        return sum(result_size(item) for item in value.values())
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return 64
+
+
+class ResultCache:
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires"] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry["value"]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+
+        value = compute()
+        size = result_size(value)
+        with self.lock:
+            if size <= self.max_bytes:
+                if key in self.entries:
+                    self._drop(key)
+                self.entries[key] = {"value": value, "size": size, "expires": now + self.ttl}
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    self._drop(next(iter(self.entries)))
+                    self.evictions += 1
+        return value
+
+    def _drop(self, key):
+        self.bytes -= self.entries.pop(key)["size"]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+@st.cache_resource
+def result_cache():
+    return ResultCache(RESULT_CACHE_MAX_MB * 1024 ** 2, RESULT_CACHE_TTL)
+
+# ============ MEMORY ACCOUNTING ============ #
+# Sizes of the shared dataset, the process-wide caches and each session's
+# state. Each session re-reports its state into a shared registry at most
+# every MEMORY_CHECK_INTERVAL seconds, and every rerun checks process memory
+# against the shared thresholds, so a warning shows up well before the
+# container limit. Sessions not seen for SESSION_IDLE are dropped.
+MEMORY_WARN = float(os.environ.get("VELOCIA_MEMORY_WARN", 0.75))
+MEMORY_CRITICAL = float(os.environ.get("VELOCIA_MEMORY_CRITICAL", 0.90))
+MEMORY_LIMIT_MB = os.environ.get("VELOCIA_MEMORY_LIMIT_MB")
+SESSION_WARN_MB = float(os.environ.get("VELOCIA_SESSION_WARN_MB", 64))
+SESSION_IDLE = 30 * 60
+MEMORY_CHECK_INTERVAL = float(os.environ.get("VELOCIA_MEMORY_CHECK_INTERVAL", 30))
+CGROUP_LIMITS = ["/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"]
+MEMORY_LEVELS = ["ok", "warning", "critical"]
+
+if "memory_alerted" not in st.session_state:
+    st.session_state.memory_alerted = "ok"
+    st.session_state.memory_checked = float("-inf")
+
+
+def object_size(value, seen=None):
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(object_size(k, seen) + object_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        size += sum(object_size(item, seen) for item in value)
+    return size
+
+
+def process_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
 
-df = load_data()
+
+def memory_limit():
+    if MEMORY_LIMIT_MB:
+        return int(float(MEMORY_LIMIT_MB) * 1024 ** 2)
+    for path in CGROUP_LIMITS:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "no limit" as a huge page-aligned number
+        if value != "max" and int(value) < 1 << 60:
+            return int(value)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def session_sizes():
+    sizes = {}
+    for key in list(st.session_state.keys()):
+        try:
+            sizes[str(key)] = object_size(st.session_state[key])
+        except KeyError:
+            continue
+    return sizes
+
+
+class SessionMemory:
+    def __init__(self, idle=SESSION_IDLE):
+        self.idle = idle
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def report(self, session, page, sizes):
+        with self.lock:
+            self.sessions[session] = {
+                "page": page,
+                "sizes": sizes,
+                "bytes": sum(sizes.values()),
+                "seen": time.monotonic(),
+            }
+
+    def snapshot(self):
+        cutoff = time.monotonic() - self.idle
+        with self.lock:
+            for session in [s for s, entry in self.sessions.items() if entry["seen"] < cutoff]:
+                del self.sessions[session]
+            return dict(self.sessions)
+
+
+@st.cache_resource
+def session_memory():
+    return SessionMemory()
+
+
+# One set of thresholds for the whole process, shared by every session
+class MemoryThresholds:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {
+            "memory_warn": MEMORY_WARN,
+            "memory_critical": MEMORY_CRITICAL,
+            "session_warn_mb": SESSION_WARN_MB,
+        }
+
+    def get(self):
+        with self.lock:
+            return dict(self.values)
+
+    def set(self, name, value):
+        with self.lock:
+            self.values[name] = value
+
+
+@st.cache_resource
+def memory_thresholds():
+    return MemoryThresholds()
+
+
+def set_memory_threshold(name):
+    memory_thresholds().set(name, st.session_state[name])
+
+
+def dataset_memory(dataset):
+    parts = {
+        "Sales frame": dataset.df,
+        "Sales cube": dataset.cube,
+        "Filter index": getattr(dataset, "filter_index", None),
+        "Sort orders": getattr(dataset, "sort_orders", None),
+        "Calendar index": dataset.calendar,
+    }
+    return {name: object_size(value) for name, value in parts.items() if value is not None}
+
+
+def cache_memory():
+    stats = result_cache().stats()
+    with perf.lock:
+        perf_bytes = object_size(perf.stats) + object_size(perf.reruns)
+        perf_entries = len(perf.stats) + len(perf.reruns)
+    rates = load_exchange_rates()
+    logo = load_logo()
+    return [
+        {"Cache": "Result cache", "Entries": stats["entries"], "Bytes": stats["bytes"], "Limit": stats["max_bytes"]},
+        {"Cache": "Performance recorder", "Entries": perf_entries, "Bytes": perf_bytes, "Limit": None},
+        {"Cache": "Exchange rates", "Entries": len(rates), "Bytes": object_size(rates), "Limit": None},
+        {"Cache": "Logo", "Entries": 1, "Bytes": len(logo), "Limit": None},
+    ]
+
+
+def memory_alerts(rss, limit, sessions):
+    thresholds = memory_thresholds().get()
+    alerts = []
+    if rss is not None and limit:
+        used = rss / limit
+        if used >= thresholds["memory_critical"]:
+            alerts.append(("critical", f"Process memory at {used:.0%} of the {limit / 1024 ** 2:,.0f} MB limit."))
+        elif used >= thresholds["memory_warn"]:
+            alerts.append(("warning", f"Process memory at {used:.0%} of the {limit / 1024 ** 2:,.0f} MB limit."))
+    session_limit = thresholds["session_warn_mb"] * 1024 ** 2
+    for session, entry in sessions.items():
+        if entry["bytes"] >= session_limit:
+            key = max(entry["sizes"], key=entry["sizes"].get)
+            alerts.append((
+                "warning",
+                f"Session {session[:8]} holds {entry['bytes'] / 1024 ** 2:,.1f} MB of state "
+                f"({key}: {entry['sizes'][key] / 1024 ** 2:,.1f} MB)."
+            ))
+    return alerts
+
+
+def check_memory(page):
+    session = session_id()
+    now = time.monotonic()
+    # Deep-sizing session state is the expensive part, so it is throttled;
+    # the Notification page always reports fresh numbers
+    stale = now - st.session_state.memory_checked >= MEMORY_CHECK_INTERVAL
+    if session is not None and (stale or page == "Notification"):
+        session_memory().report(session, page, session_sizes())
+        st.session_state.memory_checked = now
+    alerts = memory_alerts(process_rss(), memory_limit(), session_memory().snapshot())
+    level = max((MEMORY_LEVELS.index(alert_level) for alert_level, _ in alerts), default=0)
+    # Toast once when the level rises, not on every rerun while it stays high
+    if level > MEMORY_LEVELS.index(st.session_state.memory_alerted):
+        st.toast(("⚠️ " if level == 1 else "🚨 ") + alerts[0][1])
+    st.session_state.memory_alerted = MEMORY_LEVELS[level]
+    return alerts
 
 # ============ SIDEBAR STATE ============ #
 if "page" not in st.session_state:
     st.session_state.page = "Dashboard"
+if "currency" not in st.session_state:
+    st.session_state.currency = BASE_CURRENCY
+# Keep the keyed Settings widget's value while another page is shown
+st.session_state.currency = st.session_state.currency
 
 # ============ SIDEBAR ============ #
-st.markdown("""
-<style>
-/* Hilangkan padding atas & bawah sidebar */
-section[data-testid="stSidebar"] {
-    padding-top: 0.0rem;
-    padding-bottom: 0.0rem;
-}
-
-/* Hilangkan header kosong bawaan Streamlit */
-section[data-testid="stSidebar"] > div:first-child {
-    padding-top: 0;
-}
-
-/* Konten sidebar rapat */
-section[data-testid="stSidebar"] .block-container {
-    padding-top: 0.0rem;
-    padding-bottom: 0.0rem;
-}
-</style>
-""", unsafe_allow_html=True)
-
 with st.sidebar:
     col = st.columns([1, 6, 1])[1]
     with col:
-        logo = Image.open("assets/velocia_logo.png")
-        st.image(logo, width=130)
+        st.image(load_logo(), width=130)
 
     st.markdown("---")
 
@@ -644,60 +673,37 @@ def format_number(value):
     else:
         return f"{value:,.0f}"
 
-# ============ HOME PAGE ============ #
-def detect_column(df, keywords):
-    for col in df.columns:
-        for key in keywords:
-            if key.lower() in col.lower():
-                return col
-    return None
+# ============ SCATTER RENDERING ============ #
+# Each session's point budget for the scatter reduction, set from Settings
+if "scatter_method" not in st.session_state:
+    st.session_state.scatter_webgl_rows = SCATTER_WEBGL_ROWS
+    st.session_state.scatter_reduce_rows = SCATTER_REDUCE_ROWS
+    st.session_state.scatter_sample_size = SCATTER_SAMPLE_SIZE
+    st.session_state.scatter_method = SCATTER_METHODS[0]
+# Keep the keyed Settings widgets' values while another page is shown
+for setting in ["scatter_webgl_rows", "scatter_reduce_rows", "scatter_sample_size", "scatter_method"]:
+    st.session_state[setting] = st.session_state[setting]
+
+
+def scatter_settings():
+    return (
+        st.session_state.scatter_webgl_rows,
+        st.session_state.scatter_reduce_rows,
+        st.session_state.scatter_sample_size,
+        st.session_state.scatter_method,
+    )
 
 
-st.markdown("""
-<style>
-.home-compact {
-    transform: scale(0.83);
-    transform-origin: top center;
-}
-
-.chart-card {
-    background: linear-gradient(
-        180deg,
-        rgba(255,255,255,0.55),
-        rgba(240,245,255,0.75)
-    );
-    border-radius: 20px;
-    padding: 12px 14px 10px 14px;
-    box-shadow: 0 10px 26px rgba(90,100,160,0.22);
-    overflow: hidden;
-}
-
-.card-title {
-    font-size: 12px;
-    font-weight: 900;
-    margin-bottom: 2px;
-}
-
-.home-compact .js-plotly-plot text {
-    font-size: 9px !important;
-}
-
-.home-compact .plotly .legend text {
-    font-size: 8.5px !important;
-}
-
-.home-compact .plotly .xtick text,
-.home-compact .plotly .ytick text {
-    font-size: 8.5px !important;
-}
-
-.element-container {
-    margin-bottom: 0 !important;
-}
-</style>
-""", unsafe_allow_html=True)
+def scatter_note(points):
+    shown = len(points["rows"])
+    if points["density"] is not None:
+        return f"{points['total']:,} rows binned into a density map · {shown:,} outliers shown as points"
+    if shown < points["total"]:
+        return f"Showing a per-country sample of {shown:,} of {points['total']:,} rows (outliers kept)"
+    return None
 
 
+# ============ HOME PAGE ============ #
 def card_open(title):
     st.markdown(f"""
         <div class="chart-card">
@@ -709,221 +715,107 @@ def card_close():
     st.markdown("</div>", unsafe_allow_html=True)
 
 
-def home_page(df):
+def home_page(dataset):
     st.markdown('<div class="home-compact">', unsafe_allow_html=True)
 
+    df = dataset.template
+    symbol = currency_symbol(st.session_state.currency)
+    with perf_stage("home.results"):
+        results = result_cache().get_or_compute(
+            ("home", dataset.version, st.session_state.currency),
+            lambda: home_results(dataset, st.session_state.currency)
+        )
+
     revenue_col = detect_column(df, ["revenue", "sales"])
     profit_col = detect_column(df, ["profit"])
 
-    total_revenue = df[revenue_col].sum()
-    total_profit = df[profit_col].sum()
-    total_orders = len(df)
-    aov = total_revenue / total_orders if total_orders else 0
-    total_country = df["Country"].nunique()
+    total_revenue = results["total_revenue"]
+    total_profit = results["total_profit"]
+    total_orders = results["total_orders"]
+    aov = results["aov"]
+    total_country = results["total_country"]
 
     k1, k2, k3, k4, k5 = st.columns(5)
-    with k1: animated_kpi("💰 Revenue", total_revenue, "$")
-    with k2: animated_kpi("📈 Profit", total_profit, "$")
+    with k1: animated_kpi("💰 Revenue", total_revenue, symbol)
+    with k2: animated_kpi("📈 Profit", total_profit, symbol)
     with k3: animated_kpi("📦 Orders", total_orders)
-    with k4: animated_kpi("🧾 AOV", aov, "$")
+    with k4: animated_kpi("🧾 AOV", aov, symbol)
     with k5: animated_kpi("🌍 Countries", total_country)
 
     c1, c2 = st.columns(2)
 
     with c1:
         card_open("Revenue Trend")
-        trend = df.groupby(df["Date"].dt.to_period("M"))[revenue_col].sum().reset_index()
-        trend["Date"] = trend["Date"].astype(str)
-
-        fig = px.line(trend, x="Date", y=revenue_col)
-        fig.update_layout(
-            height=160,
-            margin=dict(l=32, r=60, t=10, b=78),
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)"
-        )
+        trend = results["trend"]
+
+        laps = PerfLaps("home.trend")
+        fig = home_trend_figure(trend)
+        laps.lap("figure")
         st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
+        laps.lap("send")
         card_close()
 
     with c2:
         card_open("Revenue vs Profit")
-        fig = px.scatter(
-            df,
-            x=revenue_col,
-            y=profit_col,
-            color="Country",
-            color_discrete_sequence=COLOR_PALETTE
-        )
-        fig.update_layout(
-            height=160,
-            margin=dict(l=12, r=26, t=10, b=70),
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
+        laps = PerfLaps("home.scatter")
+        points = result_cache().get_or_compute(
+            ("home-scatter", dataset.version, st.session_state.currency, scatter_settings()),
+            lambda: dataset.scatter_points(
+                revenue_col, profit_col, st.session_state.currency, scatter_settings()
+            )
         )
+        laps.lap("points")
+        fig = home_scatter_figure(points, revenue_col, profit_col)
+        laps.lap("figure")
         st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
+        laps.lap("send")
         card_close()
 
     b1, b2, b3 = st.columns(3)
 
     with b1:
         card_open("Revenue by Age Group")
-        age_df = df.groupby("Age_Group")[revenue_col].sum().reset_index()
-        fig = px.bar(age_df, x="Age_Group", y=revenue_col)
-        fig.update_layout(
-            height=155,
-            margin=dict(l=82, r=90, t=25, b=88),
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)"
-        )
+        age_df = results["age_df"]
+        laps = PerfLaps("home.age")
+        fig = home_age_figure(age_df)
+        laps.lap("figure")
         st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
+        laps.lap("send")
         card_close()
 
     with b2:
         card_open("Revenue by Category")
-        cat_df = df.groupby("Product_Category")[revenue_col].sum().reset_index()
-        fig = px.pie(
-            cat_df,
-            names="Product_Category",
-            values=revenue_col,
-            hole=0.48,
-            color_discrete_sequence=COLOR_PALETTE
-        )
-        fig.update_layout(
-            height=155,
-            margin=dict(l=10, r=150, t=0.9, b=30),
-            paper_bgcolor="rgba(0,0,0,0)",
-            showlegend=True
-        )
-        fig.update_traces(textfont_size=9)
+        cat_df = results["cat_df"]
+        laps = PerfLaps("home.category")
+        fig = home_category_figure(cat_df)
+        laps.lap("figure")
         st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
+        laps.lap("send")
         card_close()
 
     with b3:
         card_open("Sales Map Europe")
-        map_df = df.groupby("Country")[revenue_col].sum().reset_index()
-        fig = px.choropleth(
-            map_df,
-            locations="Country",
-            locationmode="country names",
-            color=revenue_col,
-            scope="europe",
-            color_continuous_scale=["#bfdbfe", "#6366f1", "#1e3a8a"]
-        )
-        fig.update_layout(
-            height=155,
-            margin=dict(l=8, r=8, t=0, b=10),
-            paper_bgcolor="rgba(0,0,0,0)",
-            coloraxis_colorbar=dict(
-                title_font=dict(size=9),
-                tickfont=dict(size=8)
-            )
-        )
-        fig.update_geos(
-            bgcolor="rgba(0,0,0,0)",
-            showframe=False,
-            showcoastlines=False
-        )
+        map_df = results["map_df"]
+        laps = PerfLaps("home.map")
+        fig = home_map_figure(map_df)
+        laps.lap("figure")
         st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
+        laps.lap("send")
         card_close()
 
     st.markdown("</div>", unsafe_allow_html=True)
 
 
 # ============ DASHBOARD PAGE ============ #
-def dashboard_page(df):
-    compare_mode = False
-    winner = None
-    loser = None
-    delta_value = 0
-    delta_text = None
-    revenue_col = detect_column(df, ["revenue", "sales", "amount"])
-    profit_col = detect_column(df, ["profit"])
-    quantity_col = detect_column(df, ["quantity", "order"])
-
-# ============ HEADER ============ #
-    st.markdown(
-        '<div class="header">🚴 Bike Sales in Europe</div>',
-        unsafe_allow_html=True
-    )
-# ============ COMPARISON MODE ============ #
-    compare_mode = st.toggle("Comparison Mode", value=False)
-
-# ============ FILTER OPTIONS ============ #
-    countries = sorted(df["Country"].dropna().unique())
-    products = sorted(df["Product"].dropna().unique())
-    years = sorted(df["Date"].dt.year.dropna().unique())
-    c1, c2, c3 = st.columns(3)
-    with c1:
-        country = (
-            st.multiselect("Country", countries, default=countries[:2])
-            if compare_mode else
-            st.selectbox("Country", ["All"] + countries)
-        )
-    with c2:
-        product = (
-            st.multiselect("Product", products, default=products[:1])
-            if compare_mode else
-            st.selectbox("Product", ["All"] + products)
-        )
-    with c3:
-        year = (
-            st.multiselect("Year", years, default=[years[-1]])
-            if compare_mode else
-            st.selectbox("Year", ["All"] + years)
-        )
-# ============ FILTER OPTIONS ============ #
-    filtered = df.copy()
-
-    if isinstance(country, list):
-        filtered = filtered[filtered["Country"].isin(country)]
-    elif country != "All":
-        filtered = filtered[filtered["Country"] == country]
-
-    if isinstance(product, list):
-        filtered = filtered[filtered["Product"].isin(product)]
-    elif product != "All":
-        filtered = filtered[filtered["Product"] == product]
-
-    if isinstance(year, list):
-        filtered = filtered[filtered["Date"].dt.year.isin(year)]
-    elif year != "All":
-        filtered = filtered[filtered["Date"].dt.year == year]
-
-# ============ CLEAN NUMERIC ============ #
-    for col in [revenue_col, profit_col]:
-        if col:
-            filtered[col] = pd.to_numeric(
-                filtered[col].astype(str)
-                .str.replace(",", "")
-                .str.replace("$", "")
-                .str.replace("€", ""),
-                errors="coerce"
-            )
-
-    filtered = filtered.dropna(subset=[revenue_col, profit_col])
-
-# ============ KPI CALCULATION ============ #
-    total_revenue = filtered[revenue_col].sum()
-    total_profit = filtered[profit_col].sum()
-    total_orders = len(filtered)
-    aov = total_revenue / total_orders if total_orders > 0 else 0
-
-# ============ WINNER / LOSER LOGIC ============ #
-    if compare_mode and len(filtered["Country"].unique()) >= 2:
-        country_rev = (
-            filtered
-            .groupby("Country")[revenue_col]
-            .sum()
-            .sort_values(ascending=False)
-        )
-        winner = country_rev.index[0]
-        loser = country_rev.index[-1]
-        top_val = country_rev.iloc[0]
-        loser_val = country_rev.iloc[-1]
-        if loser_val > 0:
-            delta_value = ((top_val - loser_val) / loser_val) * 100
-            delta_text = f"{winner} outperform {loser} by {delta_value:.1f}%"
-
+def dashboard_kpis(results, compare_mode, symbol):
+    total_revenue = results["total_revenue"]
+    total_profit = results["total_profit"]
+    total_orders = results["total_orders"]
+    aov = results["aov"]
+    winner = results["winner"]
+    loser = results["loser"]
+    delta_value = results["delta_value"]
+    delta_text = results["delta_text"]
 
 # ============ KPI DISPLAY ============ #
     k1, k2, k3, k4 = st.columns(4)
@@ -931,16 +823,16 @@ def dashboard_page(df):
         animated_kpi(
             "💰 Total Revenue",
             total_revenue,
-            "$",
+            symbol,
             highlight="winner" if compare_mode and winner else None,
-            tooltip=f"Exact: ${total_revenue:,.0f}"
+            tooltip=f"Exact: {symbol}{total_revenue:,.0f}"
         )
     with k2:
         animated_kpi(
             "📈 Total Profit",
             total_profit,
-            "$",
-            tooltip=f"Exact: ${total_profit:,.0f}"
+            symbol,
+            tooltip=f"Exact: {symbol}{total_profit:,.0f}"
         )
     with k3:
         animated_kpi(
@@ -952,8 +844,8 @@ def dashboard_page(df):
         animated_kpi(
             "🧾 AOV",
             aov,
-            "$",
-            tooltip=f"Exact AOV: ${aov:,.2f}"
+            symbol,
+            tooltip=f"Exact AOV: {symbol}{aov:,.2f}"
         )
     if compare_mode and delta_text:
         st.markdown(
@@ -998,308 +890,73 @@ def dashboard_page(df):
             f"- Strategic focus on {winner} may maximize profitability."
         )
 
+
 # ============ CHARTS ============ #
+def dashboard_trend(results, compare_mode):
     # Revenue Trend (Time Series)
-    trend = (
-        filtered
-        .groupby([filtered["Date"].dt.to_period("M"), "Country"])[revenue_col]
-        .sum()
-        .reset_index()
-    )
-    trend["Date"] = trend["Date"].astype(str)
-    fig = px.line(
-        trend,
-        x="Date",
-        y=revenue_col,
-        color="Country",
-        title="Revenue Trend (Comparison)" if compare_mode else "Revenue Trend"
-    )
-    fig.update_layout(
-        height=360,   
-        margin=dict(
-            l=80,
-            r=80,
-            t=20,
-            b=140
-        ),
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        legend=dict(
-            orientation="v",
-            yanchor="top",
-            y=0.98,
-            xanchor="left",
-            x=1.02,
-            bgcolor="rgba(255,255,255,0)",
-            font=dict(size=12)
-        )
-    )
-    fig.update_layout(
-        legend=dict(
-            orientation="h",
-            y=-0.28,
-            x=0.5,
-            xanchor="center"
-        ),
-        height=340
-    )
-    fig.update_xaxes(
-        showgrid=False,
-        fixedrange=True 
-    )
-    fig.update_yaxes(
-        showgrid=True,
-        fixedrange=True
-    )
+    trend = results["trend"]
+    laps = PerfLaps("dashboard.trend")
+    fig = trend_figure(trend, compare_mode)
+    laps.lap("figure")
     st.plotly_chart(fig, use_container_width=True)
+    laps.lap("send")
+
 
+def dashboard_breakdowns(results):
     # ============ NEW VISUALIZATIONS ============ #
     v1, v2 = st.columns(2)
     # Bar Chart – Revenue by Age Group
     with v1:
-        age_df = (
-            filtered
-            .groupby("Age_Group")[revenue_col]
-            .sum()
-            .reset_index()
-            .sort_values(revenue_col, ascending=False)
-        )
-        fig_bar = px.bar(
-            age_df,
-            x="Age_Group",
-            y=revenue_col,
-            text_auto=".2s",
-            title="Revenue by Age Group"
-        )
-        fig_bar.update_layout(
-            height=330,
-            margin=dict(l=20, r=60, t=30, b=120),  
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            title_font=dict(size=20),
-        )
-        fig_bar.update_traces(
-            textposition="inside",
-            textfont=dict(size=14, color="white"),
-            cliponaxis=True 
-        )
-        fig_bar.update_xaxes(
-            tickangle=-25,
-            automargin=True, 
-            fixedrange=True
-        )
-        fig_bar.update_yaxes(
-            automargin=True,
-            fixedrange=True
-        )
+        age_df = results["age_df"]
+        laps = PerfLaps("dashboard.age")
+        fig_bar = age_figure(age_df)
+        laps.lap("figure")
         st.plotly_chart(fig_bar, use_container_width=True)
+        laps.lap("send")
     # Pie Chart – Revenue by Product Category
     with v2:
-        category_df = (
-            filtered
-            .groupby("Product_Category")[revenue_col]
-            .sum()
-            .reset_index()
-        )
-        fig_pie = px.pie(
-            category_df,
-            names="Product_Category",
-            values=revenue_col,
-            hole=0.45,
-            title="Revenue by Product Category",
-            color_discrete_sequence=COLOR_PALETTE
-        )
-        fig_pie.update_layout(
-            height=330,
-            margin=dict(l=40, r=100, t=30, b=110),
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            title_font=dict(size=20),
-            legend=dict(
-                orientation="h",
-                y=-0.25,         
-                x=0.5,
-                xanchor="center",
-                font=dict(size=13)
-            )
-        )
-        fig_pie.update_traces(
-            textinfo="percent",
-            textposition="inside",
-            hole=0.45
-        )
+        category_df = results["category_df"]
+        laps = PerfLaps("dashboard.category")
+        fig_pie = category_figure(category_df)
+        laps.lap("figure")
         st.plotly_chart(fig_pie, use_container_width=True)
+        laps.lap("send")
 
+
+def dashboard_scatter(points, revenue_col, profit_col):
     # Revenue vs Profit (Scatter)
-    fig = px.scatter(
-        filtered,
-        x=revenue_col,
-        y=profit_col,
-        color="Country",
-        title="Revenue vs Profit",
-        color_discrete_sequence=COLOR_PALETTE
-    )
-    fig.update_layout(
-        height=370,
-        margin=dict(l=70, r=140, t=70, b=80),  # ⬅ ruang legend
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        title=dict(
-            text="Revenue vs Profit",
-            x=0.02,
-            y=0.9,
-            xanchor="left",
-            font=dict(size=22)
-        ),
-        legend=dict(
-            title="Country",
-            orientation="v",
-            x=0.98,              
-            y=0.5,
-            xanchor="left",
-            yanchor="middle",
-            font=dict(size=13),
-            bgcolor="rgba(0,0,0,0)"
-        )
-    )
-    # Axis & grid 
-    fig.update_xaxes(
-        showgrid=True,
-        gridcolor="rgba(120,120,140,0.25)",
-        zeroline=False,
-        linecolor="rgba(120,120,140,0.6)",
-        tickfont=dict(color="#555"),
-        fixedrange=True
-    )
-    fig.update_yaxes(
-        showgrid=True,
-        gridcolor="rgba(120,120,140,0.25)",
-        zeroline=False,
-        linecolor="rgba(120,120,140,0.6)",
-        tickfont=dict(color="#555"),
-        fixedrange=True
-    )
-    # Marker
-    fig.update_traces(
-        marker=dict(
-            size=10,
-            opacity=0.85,
-            line=dict(width=1, color="rgba(0,0,0,0.35)")
-        )
-    )
+    laps = PerfLaps("dashboard.scatter")
+    fig = dashboard_scatter_figure(points, revenue_col, profit_col)
+    laps.lap("figure")
     st.plotly_chart(
         fig,
         use_container_width=True,
         config={"displayModeBar": False}
     )
-    # Sales Map Europe
-    map_df = (
-        filtered
-        .groupby("Country")[revenue_col]
-        .sum()
-        .reset_index()
-    )
-    fig = px.choropleth(
-        map_df,
-        locations="Country",
-        locationmode="country names",
-        color=revenue_col,
-        title="Sales Map Europe",
-        color_continuous_scale=[
-            "#e0f2fe",
-            "#38bdf8",
-            "#1e3a8a"
-        ]
-    )
-    fig.update_layout(
-        height=420,
-        margin=dict(l=60, r=30, t=50, b=25),
-
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-
-        geo=dict(
-            scope="europe",
-            projection_type="natural earth",
-            fitbounds="locations",
-
-            bgcolor="rgba(0,0,0,0)",
-
-            showframe=False,         
-            showcoastlines=False,
-            showcountries=True,
-            countrycolor="rgba(30,41,59,0.35)",
-
-            showland=True,
-            landcolor="rgba(203,213,225,0.35)",
-
-            lataxis=dict(showgrid=False),
-            lonaxis=dict(showgrid=False)
-        ),
-
-        coloraxis_colorbar=dict(
-            title="Revenue",
-            thickness=12,
-            len=0.55,
-            y=0.5,
-            outlinewidth=0       
-        ),
-
-        title=dict(
-            text="Sales Map Europe",
-            x=0.02,
-            y=0.95,
-            xanchor="left",
-            yanchor="top",
-            font=dict(size=22)
-        )
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    laps.lap("send")
+    note = scatter_note(points)
+    if note:
+        st.caption(note)
 
-# ============ TOP PRODUCT ============ #
-    top_product = "N/A"
 
-    if "Product" in filtered.columns and revenue_col:
-        prod_rev = (
-            filtered
-            .groupby("Product")[revenue_col]
-            .sum()
-            .sort_values(ascending=False)
-        )
+def dashboard_map(results):
+    # Sales Map Europe
+    map_df = results["map_df"]
+    laps = PerfLaps("dashboard.map")
+    fig = map_figure(map_df)
+    laps.lap("figure")
+    st.plotly_chart(fig, use_container_width=True)
+    laps.lap("send")
 
-        if not prod_rev.empty:
-            top_product = prod_rev.index[0]
 
+def dashboard_insights(results, symbol):
 # ============ INSIGHT CALCULATION ============ #
-    # Top Country
-    top_country = winner if winner else "N/A"
-    # Top Age Group
-    top_age = "N/A"
-    top_age_val = 0
-    if not age_df.empty:
-        top_age = age_df.iloc[0]["Age_Group"]
-        top_age_val = age_df.iloc[0][revenue_col]
-    # Top Product Category
-    top_category = "N/A"
-    top_category_val = 0
-    if not category_df.empty:
-        top_category = (
-            category_df
-            .sort_values(revenue_col, ascending=False)
-            .iloc[0]["Product_Category"]
-        )
-        top_category_val = (
-            category_df
-            .sort_values(revenue_col, ascending=False)
-            .iloc[0][revenue_col]
-        )
-    # Trend Insight
-    trend_msg = "Revenue remains relatively stable over time."
-    if len(trend["Date"].unique()) > 3:
-        trend_msg = (
-            "Revenue exhibits noticeable monthly fluctuations, "
-            "indicating the presence of seasonal demand patterns."
-        )
+    top_country = results["top_country"]
+    top_age = results["top_age"]
+    top_age_val = results["top_age_val"]
+    top_category = results["top_category"]
+    top_category_val = results["top_category_val"]
+    trend_msg = results["trend_msg"]
 # ============ EXECUTIVE INSIGHT ============ #
     st.markdown(
         f"""
@@ -1322,11 +979,11 @@ def dashboard_page(df):
                 </li>
                 <li>
                     The <b>{top_age}</b> age group generates the highest revenue,
-                    contributing <b>${top_age_val:,.0f}</b> in total sales.
+                    contributing <b>{symbol}{top_age_val:,.0f}</b> in total sales.
                 </li>
                 <li>
                     <b>{top_category}</b> dominates product sales,
-                    delivering <b>${top_category_val:,.0f}</b> in revenue.
+                    delivering <b>{symbol}{top_category_val:,.0f}</b> in revenue.
                 </li>
                 <li>
                     {trend_msg}
@@ -1336,46 +993,603 @@ def dashboard_page(df):
         """,
         unsafe_allow_html=True
     )
-    
+
+
+# Filter widgets live in this fragment, so a filter change reruns only the
+# dashboard body, not the stylesheet, sidebar and logo at the top of the script.
+# The sections below it are plain functions: they have no widgets of their
+# own, so every filter change redraws all of them from the cached results.
+@perf_fragment
+def dashboard_body(dataset):
+    df = dataset.template
+    revenue_col = detect_column(df, ["revenue", "sales", "amount"])
+    profit_col = detect_column(df, ["profit"])
+
+# ============ COMPARISON MODE ============ #
+    compare_mode = st.toggle("Comparison Mode", value=False)
+
+# ============ FILTER OPTIONS ============ #
+    countries = sorted(dataset.cube["Country"].dropna().unique())
+    products = sorted(dataset.cube["Product"].dropna().unique())
+    years = sorted(dataset.cube["Year"].unique())
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        country = (
+            st.multiselect("Country", countries, default=countries[:2])
+            if compare_mode else
+            st.selectbox("Country", ["All"] + countries)
+        )
+    with c2:
+        product = (
+            st.multiselect("Product", products, default=products[:1])
+            if compare_mode else
+            st.selectbox("Product", ["All"] + products)
+        )
+    with c3:
+        year = (
+            st.multiselect("Year", years, default=[years[-1]])
+            if compare_mode else
+            st.selectbox("Year", ["All"] + years)
+        )
+
+# ============ REPORTING CURRENCY ============ #
+    symbol = currency_symbol(st.session_state.currency)
+
+# ============ CACHED RESULTS ============ #
+    perf_filters(
+        compare=compare_mode,
+        country=country,
+        product=product,
+        year=year,
+        currency=st.session_state.currency,
+    )
+    selection = (
+        dataset.version,
+        st.session_state.currency,
+        normalize_selection(country),
+        normalize_selection(product),
+        normalize_selection(year),
+    )
+    with perf_stage("dashboard.results"):
+        results = result_cache().get_or_compute(
+            ("dashboard", compare_mode) + selection,
+            lambda: dashboard_results(
+                dataset, country, product, year, compare_mode, st.session_state.currency
+            )
+        )
+    with perf_stage("dashboard.scatter.points"):
+        points = result_cache().get_or_compute(
+            ("scatter", scatter_settings()) + selection,
+            lambda: dataset.scatter_points(
+                revenue_col,
+                profit_col,
+                st.session_state.currency,
+                scatter_settings(),
+                Country=country,
+                Product=product,
+                Year=year
+            )
+        )
+
+# ============ SECTIONS ============ #
+    dashboard_kpis(results, compare_mode, symbol)
+    dashboard_trend(results, compare_mode)
+    dashboard_breakdowns(results)
+    dashboard_scatter(points, revenue_col, profit_col)
+    dashboard_map(results)
+    dashboard_insights(results, symbol)
+
+
+def dashboard_page(dataset):
+# ============ HEADER ============ #
+    st.markdown(
+        '<div class="header">🚴 Bike Sales in Europe</div>',
+        unsafe_allow_html=True
+    )
+    dashboard_body(dataset)
+
+# ============ DOCUMENT TABLE ============ #
+# Sorting, filtering and search run on the server (table_positions); only
+# the visible page of rows is ever materialized and sent to the browser.
+TABLE_PAGE_SIZES = [25, 50, 100, 250]
+
+
+def table_filter_widget(df, column):
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        picked = st.multiselect(f"{column} is any of", list(values.cat.categories))
+        return picked or None
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        low, high = values.min(), values.max()
+        c1, c2 = st.columns(2)
+        low_pick = c1.number_input(f"{column} from", value=float(low))
+        high_pick = c2.number_input(f"{column} to", value=float(high))
+        if (low_pick, high_pick) == (float(low), float(high)):
+            return None
+        return low_pick, high_pick
+    if pd.api.types.is_datetime64_any_dtype(values):
+        low, high = values.min().date(), values.max().date()
+        picked = st.date_input(f"{column} between", [low, high])
+        if len(picked) != 2 or tuple(picked) == (low, high):
+            return None
+        return pd.to_datetime(picked[0]), pd.to_datetime(picked[1]) + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
+    st.caption(f"{column} has no column filter; use search instead.")
+    return None
+
+
+# ============ MESSAGE STORE ============ #
+# Messages live in an append-only SQLite file in WAL mode, so they survive
+# restarts and readers never block the writer. Sends from every session are
+# queued and committed together by one writer thread; each send waits for
+# its batch to commit. Pages read one keyset page at a time, newest first.
+MESSAGE_DB = os.environ.get("VELOCIA_MESSAGES", "messages.db")
+MESSAGE_CATEGORIES = ["General", "Support", "Feedback"]
+MESSAGE_BATCH_DELAY = 0.05
+MESSAGE_COMMIT_TIMEOUT = 5
+MESSAGE_COLUMNS = ["Time", "Category", "Name", "Email", "Message"]
+
+
+def connect_sqlite(path):
+    con = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+
+class MessageStore:
+    def __init__(self, path=MESSAGE_DB):
+        self.path = path
+        with connect_sqlite(path) as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    time TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    name TEXT,
+                    email TEXT,
+                    message TEXT
+                )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS messages_time ON messages (time, id)")
+            con.execute("CREATE INDEX IF NOT EXISTS messages_category_time ON messages (category, time, id)")
+        self.lock = threading.Lock()
+        self.pending = []
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="message-writer", daemon=True)
+        self.thread.start()
+
+    # Returns ("sent", None), ("failed", reason) or ("pending", None) when the
+    # wait ran out while the row's batch was already being committed
+    def add(self, name, email, category, message):
+        send = {
+            "row": (datetime.now().isoformat(timespec="microseconds"), category, name, email, message),
+            "done": threading.Event(),
+            "error": None,
+        }
+        with self.lock:
+            self.pending.append(send)
+        self.wake.set()
+        if not send["done"].wait(MESSAGE_COMMIT_TIMEOUT):
+            with self.lock:
+                if send in self.pending:
+                    # Never written, so a retry cannot duplicate it
+                    self.pending.remove(send)
+                    return "failed", "timed out"
+            return "pending", None
+        if send["error"] is not None:
+            return "failed", send["error"]
+        return "sent", None
+
+    def run(self):
+        con = connect_sqlite(self.path)
+        while True:
+            self.wake.wait()
+            # Give concurrent sends a moment to join the same transaction
+            time.sleep(MESSAGE_BATCH_DELAY)
+            self.wake.clear()
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                continue
+            error = None
+            try:
+                with con:
+                    con.executemany(
+                        "INSERT INTO messages (time, category, name, email, message) VALUES (?, ?, ?, ?, ?)",
+                        [send["row"] for send in batch]
+                    )
+            except sqlite3.Error as failure:
+                error = failure
+            for send in batch:
+                send["error"] = error
+                send["done"].set()
+
+    def read(self, sql, params=()):
+        con = connect_sqlite(self.path)
+        try:
+            return con.execute(sql, params).fetchall()
+        finally:
+            con.close()
+
+    def count(self, category=None):
+        if category is None:
+            return self.read("SELECT count(*) FROM messages")[0][0]
+        return self.read("SELECT count(*) FROM messages WHERE category = ?", (category,))[0][0]
+
+    def page(self, category=None, before=None, limit=50):
+        clauses, params = [], []
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        if before is not None:
+            clauses.append("(time, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.read(
+            f"SELECT id, time, category, name, email, message FROM messages {where} "
+            "ORDER BY time DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        )
+        # The extra row only tells whether an older page exists
+        cursor = (rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        frame = pd.DataFrame([row[1:] for row in rows[:limit]], columns=MESSAGE_COLUMNS)
+        frame["Time"] = pd.to_datetime(frame["Time"])
+        return frame, cursor
+
+
+@st.cache_resource
+def message_store():
+    return MessageStore()
+
+# ============ REVIEW STORE ============ #
+# Every rating is kept in reviews.db, and review_stats holds one running
+# count per star value, updated in the same transaction as the insert. The
+# summary reads those five rows, so it costs the same at any review count.
+REVIEW_DB = os.environ.get("VELOCIA_REVIEWS", "reviews.db")
+REVIEW_RATINGS = [1, 2, 3, 4, 5]
+
+
+class ReviewStore:
+    def __init__(self, path=REVIEW_DB):
+        self.path = path
+        with connect_sqlite(path) as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS reviews (
+                    id INTEGER PRIMARY KEY,
+                    time TEXT NOT NULL,
+                    rating INTEGER NOT NULL
+                )
+            """)
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS review_stats (
+                    rating INTEGER PRIMARY KEY,
+                    count INTEGER NOT NULL
+                )
+            """)
+            con.executemany(
+                "INSERT OR IGNORE INTO review_stats (rating, count) VALUES (?, 0)",
+                [(rating,) for rating in REVIEW_RATINGS]
+            )
+
+    def add(self, rating):
+        con = connect_sqlite(self.path)
+        try:
+            with con:
+                con.execute(
+                    "INSERT INTO reviews (time, rating) VALUES (?, ?)",
+                    (datetime.now().isoformat(timespec="microseconds"), rating)
+                )
+                con.execute("UPDATE review_stats SET count = count + 1 WHERE rating = ?", (rating,))
+        finally:
+            con.close()
+
+    def summary(self):
+        con = connect_sqlite(self.path)
+        try:
+            counts = dict(con.execute("SELECT rating, count FROM review_stats").fetchall())
+        finally:
+            con.close()
+        histogram = {rating: counts.get(rating, 0) for rating in REVIEW_RATINGS}
+        total = sum(histogram.values())
+        mean = sum(rating * count for rating, count in histogram.items()) / total if total else None
+        return {"count": total, "mean": mean, "histogram": histogram}
+
+
+@st.cache_resource
+def review_store():
+    return ReviewStore()
+
 # ============ OTHER PAGES  ============ #
-def document_page(df):
+@perf_fragment
+def document_page(dataset):
+    df = dataset.df
     st.title("📄 Dataset Document")
-    st.dataframe(df, use_container_width=True)
-    st.download_button("⬇ Download CSV", df.to_csv(index=False), "sales_export.csv")
+    if df is None:
+        st.info(f"Row browsing needs the in-memory backend; this app is running on {dataset.backend}.")
+        return
+
+    c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
+    with c1:
+        search = st.text_input("Search", placeholder="Country, product, category…").strip()
+    with c2:
+        filter_col = st.selectbox("Filter Column", ["None"] + list(df.columns))
+    with c3:
+        sort_col = st.selectbox("Sort By", ["None"] + list(df.columns))
+    with c4:
+        ascending = st.toggle("Ascending", value=True)
+
+    filter_col = None if filter_col == "None" else filter_col
+    sort_col = None if sort_col == "None" else sort_col
+    condition = table_filter_widget(df, filter_col) if filter_col else None
+
+    query = (dataset.version, sort_col, ascending, filter_col, str(condition), search)
+    perf_filters(
+        search=search,
+        filter=filter_col,
+        condition=condition,
+        sort=sort_col,
+        ascending=ascending,
+    )
+    laps = PerfLaps("document")
+    if condition is None and not search:
+        # Plain sort orders are already memoized on the dataset
+        positions = table_positions(dataset, sort_col, ascending, None, None, "")
+    else:
+        positions = result_cache().get_or_compute(
+            ("document",) + query,
+            lambda: table_positions(dataset, sort_col, ascending, filter_col, condition, search)
+        )
+    matched = len(df) if positions is None else len(positions)
+    laps.lap("query")
+
+    # Start again from page 1 whenever the query changes
+    if st.session_state.get("document_query") != query:
+        st.session_state.document_query = query
+        st.session_state.document_page = 1
+
+    p1, p2, p3 = st.columns([1, 1, 4])
+    with p1:
+        page_size = st.selectbox("Rows per Page", TABLE_PAGE_SIZES, index=1)
+    pages = max(1, -(-matched // page_size))
+    with p2:
+        page = st.number_input(
+            "Page",
+            min_value=1,
+            max_value=pages,
+            value=min(st.session_state.document_page, pages),
+            step=1
+        )
+    st.session_state.document_page = page
+
+    start = (page - 1) * page_size
+    stop = min(start + page_size, matched)
+    rows = slice(start, stop) if positions is None else positions[start:stop]
+    with p3:
+        st.caption(
+            f"Rows {start + 1 if matched else 0:,}–{stop:,} of {matched:,} matching · "
+            f"{len(df):,} total · page {page:,} of {pages:,}"
+        )
+    laps = PerfLaps("document")
+    page_rows = df.iloc[rows]
+    laps.lap("rows")
+    st.dataframe(page_rows, use_container_width=True)
+    laps.lap("send")
+
+    formats = [fmt for fmt in EXPORT_FORMATS if fmt != "Parquet" or pq is not None]
+    e1, e2 = st.columns([1, 3])
+    with e1:
+        fmt = st.selectbox("Export Format", formats)
+    extension, mime = EXPORT_FORMATS[fmt]
+    with e2:
+        st.download_button(
+            f"⬇ Download {matched:,} Rows",
+            lambda: write_export(df, positions, fmt),
+            f"sales_export.{extension}",
+            mime=mime
+        )
 
-def calendar_page(df):
+@perf_fragment
+def calendar_page(dataset):
+    calendar = dataset.calendar
     st.title("📅 Sales Calendar")
-    start, end = st.date_input("Date Range", [df["Date"].min(), df["Date"].max()])
-    f = df[(df["Date"] >= pd.to_datetime(start)) & (df["Date"] <= pd.to_datetime(end))]
-    st.metric("Total Revenue", f"${f['Revenue'].sum():,.0f}")
-    st.dataframe(f)
+    if not len(calendar["days"]):
+        st.info("No dated sales to show.")
+        return
+
+    first, last = calendar["days"][0].astype(object), calendar["days"][-1].astype(object)
+    picked = st.date_input("Date Range", [first, last], min_value=first, max_value=last)
+    if len(picked) != 2:
+        st.caption("Pick an end date to complete the range.")
+        return
+    start, end = picked
+
+    symbol = currency_symbol(st.session_state.currency)
+    perf_filters(start=start, end=end, currency=st.session_state.currency)
+    with perf_stage("calendar.range"):
+        totals = range_totals(calendar, start, end, st.session_state.currency)
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Total Revenue", f"{symbol}{totals.get('Revenue', 0):,.0f}")
+    k2.metric("Total Profit", f"{symbol}{totals.get('Profit', 0):,.0f}")
+    k3.metric("Units Sold", f"{totals.get('Quantity', 0):,.0f}")
+    k4.metric("Orders", f"{totals['Orders']:,}")
+
+    # Rows are only sliced out of the sorted frame when asked for, a page at a time
+    lo, hi = totals["rows"]
+    if st.toggle(f"Show {hi - lo:,} Transactions"):
+        page_size = TABLE_PAGE_SIZES[-1]
+        pages = max(1, -(-(hi - lo) // page_size))
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+        start_row = lo + (page - 1) * page_size
+        laps = PerfLaps("calendar")
+        page_rows = dataset.date_rows(start_row, min(start_row + page_size, hi))
+        laps.lap("rows")
+        st.dataframe(page_rows, use_container_width=True)
+        laps.lap("send")
 
 def message_page():
     st.title("💬 Message Center")
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    store = message_store()
+    if "message_cursors" not in st.session_state:
+        st.session_state.message_cursors = [None]
 
     with st.form("msg"):
         n = st.text_input("Name")
         e = st.text_input("Email")
-        c = st.selectbox("Category", ["General", "Support", "Feedback"])
+        c = st.selectbox("Category", MESSAGE_CATEGORIES)
         m = st.text_area("Message")
         if st.form_submit_button("Send"):
-            st.session_state.messages.append({"Name": n, "Email": e, "Category": c, "Message": m, "Time": datetime.now()})
-            st.success("Message sent!")
+            status, error = store.add(n, e, c, m)
+            if status == "sent":
+                st.session_state.message_cursors = [None]
+                st.success("Message sent!")
+            elif status == "pending":
+                st.info("Message is still being saved; it will appear shortly, no need to send it again.")
+            else:
+                st.error(f"Message could not be saved: {error}")
+
+    f1, f2 = st.columns([3, 1])
+    category = f1.selectbox("Show", ["All"] + MESSAGE_CATEGORIES)
+    page_size = f2.selectbox("Per Page", TABLE_PAGE_SIZES, index=1)
+    category = None if category == "All" else category
+    view = (category, page_size)
+    # Paging restarts from the newest message whenever the view changes
+    if st.session_state.get("message_view") != view:
+        st.session_state.message_view = view
+        st.session_state.message_cursors = [None]
+    cursors = st.session_state.message_cursors
+
+    laps = PerfLaps("message")
+    rows, cursor = store.page(category, cursors[-1], page_size)
+    total = store.count(category)
+    laps.lap("query")
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    laps.lap("send")
+
+    p1, p2, p3 = st.columns([1, 2, 1])
+    if p1.button("◀ Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    p2.caption(f"Page {len(cursors):,} of {max(1, -(-total // page_size)):,} · {total:,} messages")
+    if p3.button("Older ▶", disabled=cursor is None):
+        cursors.append(cursor)
+        st.rerun()
+
+def notification_page(dataset, alerts):
+    st.title("🔔 Notifications")
+    for level, message in sorted(alerts, key=lambda alert: MEMORY_LEVELS.index(alert[0]), reverse=True):
+        (st.error if level == "critical" else st.warning)(message)
+    if not alerts:
+        st.info("🔄 System running normally.")
+
+    st.subheader("🧠 Memory")
+    rss, limit = process_rss(), memory_limit()
+    sessions = session_memory().snapshot()
+    parts = dataset_memory(dataset)
+    caches = pd.DataFrame(cache_memory())
+    mb = 1024 ** 2
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Process", "n/a" if rss is None else f"{rss / mb:,.0f} MB")
+    m2.metric("Dataset", f"{sum(parts.values()) / mb:,.1f} MB")
+    m3.metric("Caches", f"{caches['Bytes'].sum() / mb:,.1f} MB")
+    m4.metric("Sessions", f"{sum(e['bytes'] for e in sessions.values()) / mb:,.1f} MB", f"{len(sessions):,} active", delta_color="off")
+    if rss is not None and limit:
+        st.progress(min(rss / limit, 1.0), text=f"{rss / limit:.0%} of the {limit / mb:,.0f} MB limit")
 
-    st.dataframe(pd.DataFrame(st.session_state.messages))
+    c1, c2 = st.columns(2)
+    with c1:
+        st.caption("Dataset objects")
+        st.dataframe(
+            pd.DataFrame({"Object": list(parts), "MB": [size / mb for size in parts.values()]}),
+            use_container_width=True,
+            hide_index=True
+        )
+    with c2:
+        st.caption("Cache occupancy")
+        st.dataframe(
+            caches.assign(MB=caches["Bytes"] / mb, **{"Limit MB": caches["Limit"] / mb})
+                  .drop(columns=["Bytes", "Limit"]),
+            use_container_width=True,
+            hide_index=True
+        )
 
-def notification_page(df):
-    st.title("🔔 Notifications")
-    st.info("🔄 System running normally.")
+    st.caption("Sessions")
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "Session": session[:8],
+                "Page": entry["page"],
+                "MB": entry["bytes"] / mb,
+                "Largest key": max(entry["sizes"], key=entry["sizes"].get, default=""),
+                "Idle (s)": int(time.monotonic() - entry["seen"]),
+            }
+            for session, entry in sorted(sessions.items(), key=lambda item: -item[1]["bytes"])
+        ]),
+        use_container_width=True,
+        hide_index=True
+    )
+    own = sessions.get(session_id())
+    if own is not None:
+        with st.expander("This session's state"):
+            st.dataframe(
+                pd.DataFrame({"Key": list(own["sizes"]), "KB": [size / 1024 for size in own["sizes"].values()]})
+                  .sort_values("KB", ascending=False),
+                use_container_width=True,
+                hide_index=True
+            )
+
+    with st.expander("⚙️ Alert Thresholds"):
+        # Widgets mirror the shared thresholds, so a change made in another
+        # session shows up here, and a change here applies to every session
+        for name, value in memory_thresholds().get().items():
+            st.session_state[name] = value
+        st.slider(
+            "Warn at (share of limit)", 0.1, 1.0, step=0.05,
+            key="memory_warn", on_change=set_memory_threshold, args=("memory_warn",)
+        )
+        st.slider(
+            "Critical at (share of limit)", 0.1, 1.0, step=0.05,
+            key="memory_critical", on_change=set_memory_threshold, args=("memory_critical",)
+        )
+        st.number_input(
+            "Warn when one session holds (MB)",
+            min_value=0.0,
+            step=16.0,
+            key="session_warn_mb",
+            on_change=set_memory_threshold,
+            args=("session_warn_mb",)
+        )
+        st.caption(
+            "Thresholds apply to every session. Defaults come from VELOCIA_MEMORY_WARN, "
+            "VELOCIA_MEMORY_CRITICAL and VELOCIA_SESSION_WARN_MB; set VELOCIA_MEMORY_LIMIT_MB "
+            "when the container limit cannot be read from cgroups."
+        )
 
 def review_page():
     st.title("⭐ Review")
+    store = review_store()
     r = st.slider("Rate", 1, 5, 5)
     if st.button("Submit"):
+        store.add(r)
         st.success(f"Thanks for rating {r} ⭐")
 
+    summary = store.summary()
+    s1, s2 = st.columns(2)
+    s1.metric("Average Rating", "–" if summary["mean"] is None else f"{summary['mean']:.2f} ⭐")
+    s2.metric("Reviews", f"{summary['count']:,}")
+    histogram = pd.DataFrame({
+        "Rating": [f"{rating} ⭐" for rating in summary["histogram"]],
+        "Reviews": list(summary["histogram"].values()),
+    })
+    fig = px.bar(histogram, x="Reviews", y="Rating", orientation="h")
+    fig.update_layout(
+        height=220,
+        margin=dict(l=10, r=10, t=10, b=10),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)"
+    )
+    st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
+
 def about_page():
     st.title("ℹ️ About")
     st.write("Bike Sales in Europe Dashboard using Streamlit & Plotly")
@@ -1388,17 +1602,170 @@ def settings_page():
     st.title("⚙️ Settings")
     if st.button("Reset App"):
         st.experimental_rerun()
+
+    codes = sorted(load_exchange_rates())
+    if st.session_state.currency not in codes:
+        st.session_state.currency = BASE_CURRENCY
+    st.selectbox("Reporting Currency", codes, key="currency")
+
+    st.caption(f"Dataset version {dataset.version} · {len(dataset):,} rows · {dataset.backend} backend")
+    worker = dataset_store().worker
+    if worker.busy:
+        st.caption("⏳ Rebuilding in the background; pages keep serving the current version.")
+    if worker.error is not None:
+        st.warning(f"Last background rebuild failed: {worker.error}")
+    if st.button("🔄 Reload Data"):
+        worker.request(force=True)
+        st.toast("Reload started in the background.")
+
+    with st.expander("🎯 Scatter Rendering"):
+        st.number_input(
+            "Switch to WebGL above (rows)",
+            min_value=0,
+            step=1_000,
+            key="scatter_webgl_rows"
+        )
+        st.number_input(
+            "Reduce points above (rows)",
+            min_value=1_000,
+            step=10_000,
+            key="scatter_reduce_rows"
+        )
+        st.number_input(
+            "Sample size",
+            min_value=1_000,
+            step=1_000,
+            key="scatter_sample_size"
+        )
+        st.selectbox("Reduction method", SCATTER_METHODS, key="scatter_method")
+
+    with st.expander("🗂️ Partitioned Layout"):
+        st.caption(
+            f"Year/Country Parquet directories for the DuckDB backend "
+            f"(VELOCIA_PARQUET={PARTITION_DIR}). Also built by "
+            f"`python app.py --build-partitions`."
+        )
+        if os.path.isdir(PARTITION_DIR):
+            st.caption(f"{len(parquet_files(PARTITION_DIR)):,} partition files in {PARTITION_DIR}/")
+        if dataset.df is not None and pa_ds is not None and st.button("🗂️ Build Partitions"):
+            count = build_partitions(dataset.df)
+            st.success(f"Wrote {count:,} partition files to {PARTITION_DIR}/")
+
+    with st.expander("📦 Rerun Payload"):
+        sheet = build_stylesheet(tuple(os.path.getmtime(path) for path in STYLESHEETS))
+        markup = stylesheet_markup()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Inline <style> Blocks", f"{sheet['raw_bytes']:,} B")
+        c2.metric("Minified", f"{len(sheet['css'].encode()):,} B")
+        c3.metric("Sent per Rerun", f"{len(markup.encode()):,} B")
+        st.caption(f"Stylesheet: {sheet['name']}")
+
+    with st.expander("⏱️ Performance"):
+        summary = perf.summary()
+        if summary.empty:
+            st.caption("No timings recorded yet.")
+        else:
+            reruns = summary[summary["Stage"] == "rerun"].sort_values("Mean (ms)", ascending=False)
+            st.markdown("**Rerun latency by page**")
+            st.dataframe(reruns.drop(columns="Stage"), use_container_width=True, hide_index=True)
+            st.markdown("**Stages by total time**")
+            st.dataframe(
+                summary[summary["Stage"] != "rerun"].sort_values("Total (s)", ascending=False),
+                use_container_width=True,
+                hide_index=True
+            )
+        if perf.reruns:
+            last = perf.reruns[-1]
+            st.caption(
+                f"Last rerun: {last['page']} in {last['seconds'] * 1000:,.0f} ms · "
+                + " · ".join(f"{name} {value * 1000:,.0f} ms" for name, value in last["stages"].items())
+            )
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            st.download_button("⬇ Prometheus", perf.prometheus(), "metrics.prom", mime="text/plain")
+        with c2:
+            st.download_button(
+                "⬇ Rerun Log (JSONL)",
+                "".join(json.dumps(record, default=json_value) + "\n" for record in perf.reruns),
+                "perf.jsonl",
+                mime="application/jsonl"
+            )
+        with c3:
+            if st.button("🧹 Reset Timings"):
+                perf.clear()
+        st.caption(f"Also written to {PERF_PROM_PATH} and {PERF_JSONL_PATH}.")
+
+    with st.expander("🔬 Profiler"):
+        if PROFILE_TOKEN:
+            token = st.text_input("Profiler Token", type="password")
+            st.radio(
+                "Profile",
+                list(PROFILE_SCOPES),
+                format_func=PROFILE_SCOPES.get,
+                key="profile_next",
+                horizontal=True,
+                disabled=token != PROFILE_TOKEN,
+                help="Samples the call stack of the chosen rerun and saves a speedscope file."
+            )
+            st.caption("Or add ?profile=<token> (and &profile_scope=fragment) to the URL of the page to profile.")
+        else:
+            st.caption("Set VELOCIA_PROFILE_TOKEN to enable profiling.")
+        saved = sorted(glob.glob(os.path.join(PROFILE_DIR, "*.speedscope.json")), reverse=True)
+        for path in saved[:5]:
+            with open(path, "rb") as f:
+                st.download_button(f"⬇ {os.path.basename(path)}", f.read(), os.path.basename(path), mime="application/json")
+        if saved:
+            st.caption(f"{len(saved):,} profiles in {PROFILE_DIR}/ · open them at speedscope.app")
+
+    with st.expander("⚡ Result Cache"):
+        stats = result_cache().stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Hit Rate", f"{stats['hit_rate']:.0%}")
+        c2.metric("Hits / Misses", f"{stats['hits']:,} / {stats['misses']:,}")
+        c3.metric("Entries", f"{stats['entries']:,}")
+        c4.metric(
+            "Memory",
+            f"{stats['bytes'] / 1024 ** 2:,.1f} / {stats['max_bytes'] / 1024 ** 2:,.0f} MB"
+        )
+        st.caption(f"Evictions: {stats['evictions']:,}")
+        if st.button("🧹 Clear Result Cache"):
+            result_cache().clear()
+
+    with st.expander("🧮 Memory by Column"):
+        report = pd.DataFrame(dataset.schema_report)
+        if not report.empty:
+            for col in ["Before", "After", "Saved"]:
+                report[col] = report[col] / 1024 ** 2
+            st.dataframe(
+                report.rename(columns={
+                    "Before": "Raw (MB)",
+                    "After": "Compact (MB)",
+                    "Saved": "Saved (MB)",
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+            st.caption(
+                f"Total: {report['Before'].sum():,.1f} MB → "
+                f"{report['After'].sum():,.1f} MB"
+            )
 # ============ ROUTER ============ #
 page = st.session_state.page
-{
-    "Home": lambda: home_page(df),
-    "Dashboard": lambda: dashboard_page(df),
-    "Document": lambda: document_page(df),
-    "Calendar": lambda: calendar_page(df),
-    "Message": message_page,
-    "Notification": lambda: notification_page(df),
-    "Review": review_page,
-    "About": about_page,
-    "Help": help_page,
-    "Settings": settings_page
-}.get(page, lambda: dashboard_page(df))()
\ No newline at end of file
+script_run = perf_active.get()
+# Stages from here on belong to the page being shown
+script_run["page"] = page
+alerts = check_memory(page)
+with profile_rerun("rerun", page, dataset.version):
+    {
+        "Home": lambda: home_page(dataset),
+        "Dashboard": lambda: dashboard_page(dataset),
+        "Document": lambda: document_page(dataset),
+        "Calendar": lambda: calendar_page(dataset),
+        "Message": message_page,
+        "Notification": lambda: notification_page(dataset, alerts),
+        "Review": review_page,
+        "About": about_page,
+        "Help": help_page,
+        "Settings": settings_page
+    }.get(page, lambda: dashboard_page(dataset))()
+perf_finish(script_run, dataset.version)
\ No newline at end of file
@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# The engine and figure modules load no data and start no threads on import;
+# only the synthetic files below are read
+import charts
+import sales_engine as engine
+
+# Usage:
+#   python benchmark.py                          10k, 1M and 10M rows
+#   python benchmark.py --rows 10000 100000      custom scales
+#   python benchmark.py --compare old.json       ratios against an earlier run
+BENCH_DIR = os.path.join(engine.SNAPSHOT_DIR, "bench")
+DEFAULT_ROWS = [10_000, 1_000_000, 10_000_000]
+GENERATE_CHUNK_ROWS = 500_000
+HEAVY_ROWS = 1_000_000
+# Bumped whenever generated files change, so stale cached CSVs are not reused
+GENERATOR_VERSION = 2
+
+
+# ============ SYNTHETIC DATA ============ #
+# Same columns, formats and dirty values as Sales.csv: amounts with €/£
+# symbols and thousands separators, a few unparseable dates, rows unsorted.
+COUNTRIES = {
+    "United States": (0.34, ["California", "Washington", "Oregon", "Texas", "New York", "Florida", "Illinois", "Georgia"]),
+    "Australia": (0.20, ["New South Wales", "Victoria", "Queensland", "South Australia", "Tasmania"]),
+    "Canada": (0.13, ["British Columbia", "Alberta", "Ontario", "Quebec"]),
+    "United Kingdom": (0.12, ["England"]),
+    "Germany": (0.11, ["Bayern", "Hessen", "Hamburg", "Nordrhein-Westfalen", "Saarland", "Brandenburg"]),
+    "France": (0.10, ["Seine (Paris)", "Nord", "Hauts de Seine", "Essonne", "Yveline", "Loiret", "Moselle"]),
+}
+COUNTRY_CURRENCY = {"Germany": "€", "France": "€", "United Kingdom": "£"}
+# Share of rows from a country that were recorded in its local currency
+LOCAL_CURRENCY_SHARE = 0.3
+AGE_GROUPS = {
+    "Adults (35-64)": (0.50, 35, 64),
+    "Young Adults (25-34)": (0.35, 25, 34),
+    "Youth (<25)": (0.13, 17, 24),
+    "Seniors (64+)": (0.02, 65, 87),
+}
+CATEGORIES = {
+    "Accessories": (0.62, {
+        "Bike Racks": ["Hitch Rack - 4-Bike"],
+        "Bike Stands": ["All-Purpose Bike Stand"],
+        "Bottles and Cages": ["Water Bottle - 30 oz.", "Mountain Bottle Cage", "Road Bottle Cage"],
+        "Cleaners": ["Bike Wash - Dissolver"],
+        "Fenders": ["Fender Set - Mountain"],
+        "Helmets": ["Sport-100 Helmet, Red", "Sport-100 Helmet, Blue", "Sport-100 Helmet, Black"],
+        "Hydration Packs": ["Hydration Pack - 70 oz."],
+        "Tires and Tubes": ["Patch Kit/8 Patches", "Mountain Tire Tube", "Road Tire Tube", "Touring Tire Tube",
+                            "HL Mountain Tire", "ML Mountain Tire", "LL Road Tire", "HL Road Tire", "Touring Tire"],
+    }),
+    "Bikes": (0.25, {
+        "Mountain Bikes": [f"Mountain-{model} {color}, {size}" for model in (100, 200, 400, 500)
+                           for color in ("Silver", "Black") for size in (38, 42, 44, 48)],
+        "Road Bikes": [f"Road-{model} {color}, {size}" for model in (150, 250, 350, 550, 650, 750)
+                       for color in ("Red", "Black") for size in (44, 48, 52, 58, 62)],
+        "Touring Bikes": [f"Touring-{model} {color}, {size}" for model in (1000, 2000, 3000)
+                          for color in ("Blue", "Yellow") for size in (46, 50, 54, 60)],
+    }),
+    "Clothing": (0.13, {
+        "Caps": ["AWC Logo Cap"],
+        "Gloves": [f"Half-Finger Gloves, {size}" for size in "SML"],
+        "Jerseys": [f"{kind} Jersey, {size}" for kind in ("Short-Sleeve Classic", "Long-Sleeve Logo")
+                    for size in ("S", "M", "L", "XL")],
+        "Shorts": [f"Women's Mountain Shorts, {size}" for size in "SML"],
+        "Socks": [f"Racing Socks, {size}" for size in "ML"],
+        "Vests": [f"Classic Vest, {size}" for size in "SML"],
+    }),
+}
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+BAD_DATE_SHARE = 0.0005
+
+
+def product_table():
+    rows = []
+    for category, (category_share, subs) in CATEGORIES.items():
+        products = [(sub, product) for sub, names in subs.items() for product in names]
+        for sub, product in products:
+            rows.append((category, sub, product, category_share / len(products)))
+    table = pd.DataFrame(rows, columns=["Product_Category", "Sub_Category", "Product", "Weight"])
+    rng = np.random.default_rng(7)
+    # Bikes cost hundreds to thousands; accessories and clothing a few dollars
+    base = np.where(table["Product_Category"] == "Bikes", 1_500, 25)
+    table["Unit_Cost"] = (base * rng.uniform(0.3, 2.0, len(table))).round().astype(int).clip(1)
+    table["Unit_Price"] = (table["Unit_Cost"] * rng.uniform(1.3, 2.2, len(table))).round().astype(int)
+    return table
+
+
+def money_text(values, symbols):
+    text = pd.Series(values).astype(str).to_numpy(dtype=object)
+    marked = symbols != ""
+    # Local-currency rows were exported as e.g. "€11,020"; assign by position
+    text[marked] = symbols[marked] + pd.Series(values[marked]).map("{:,}".format).to_numpy(dtype=object)
+    assert not pd.isna(text).any(), "generated money value is NaN"
+    return text
+
+
+def synthetic_chunk(rows, rng, products):
+    countries = list(COUNTRIES)
+    country = rng.choice(len(countries), rows, p=[COUNTRIES[name][0] for name in countries])
+    state = np.empty(rows, dtype=object)
+    for i, name in enumerate(countries):
+        at = np.flatnonzero(country == i)
+        state[at] = rng.choice(COUNTRIES[name][1], len(at))
+    country_names = np.array(countries, dtype=object)[country]
+
+    groups = list(AGE_GROUPS)
+    group = rng.choice(len(groups), rows, p=[AGE_GROUPS[name][0] for name in groups])
+    low = np.array([AGE_GROUPS[name][1] for name in groups])[group]
+    high = np.array([AGE_GROUPS[name][2] for name in groups])[group]
+    age = rng.integers(low, high + 1)
+
+    product = products.iloc[rng.choice(len(products), rows, p=products["Weight"] / products["Weight"].sum())]
+    bikes = (product["Product_Category"] == "Bikes").to_numpy()
+    quantity = np.where(bikes, rng.integers(1, 5, rows), rng.integers(1, 33, rows))
+    unit_cost = product["Unit_Cost"].to_numpy()
+    unit_price = product["Unit_Price"].to_numpy()
+    cost = quantity * unit_cost
+    revenue = quantity * unit_price
+
+    days = rng.integers(0, (pd.Timestamp("2016-12-31") - pd.Timestamp("2011-01-01")).days + 1, rows)
+    dates = pd.Timestamp("2011-01-01") + pd.to_timedelta(days, unit="D")
+    date_text = pd.Series(dates.strftime("%Y-%m-%d"))
+    date_text[rng.random(rows) < BAD_DATE_SHARE] = "bad"
+
+    local = np.array([COUNTRY_CURRENCY.get(name, "") for name in countries], dtype=object)[country]
+    symbols = np.where(rng.random(rows) < LOCAL_CURRENCY_SHARE, local, "")
+    return pd.DataFrame({
+        "Date": date_text,
+        "Day": dates.day,
+        "Month": np.array(MONTHS, dtype=object)[dates.month - 1],
+        "Year": dates.year,
+        "Customer_Age": age,
+        "Age_Group": np.array(groups, dtype=object)[group],
+        "Customer_Gender": rng.choice(["M", "F"], rows),
+        "Country": country_names,
+        "State": state,
+        "Product_Category": product["Product_Category"].to_numpy(),
+        "Sub_Category": product["Sub_Category"].to_numpy(),
+        "Product": product["Product"].to_numpy(),
+        "Order_Quantity": quantity,
+        "Unit_Cost": unit_cost,
+        "Unit_Price": unit_price,
+        "Profit": money_text(revenue - cost, symbols),
+        "Cost": money_text(cost, symbols),
+        "Revenue": money_text(revenue, symbols),
+    })
+
+
+def generate_sales(rows, path, seed=0):
+    rng = np.random.default_rng(seed)
+    products = product_table()
+    tmp = path + ".tmp"
+    for start in range(0, rows, GENERATE_CHUNK_ROWS):
+        chunk = synthetic_chunk(min(GENERATE_CHUNK_ROWS, rows - start), rng, products)
+        chunk.to_csv(tmp, mode="a" if start else "w", header=not start, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def synthetic_path(rows, seed=0):
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"sales_{rows}_{seed}_v{GENERATOR_VERSION}.csv")
+    if not os.path.exists(path):
+        generate_sales(rows, path, seed)
+    return path
+
+
+# ============ STAGES ============ #
+def timed(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "repeat": repeat,
+    }
+
+
+def run_scale(rows, repeat, seed=0):
+    path = synthetic_path(rows, seed)
+    heavy = 1 if rows >= HEAVY_ROWS else repeat
+    results = {}
+
+    def stage(name, fn, times=repeat):
+        value, results[name] = timed(fn, times)
+        print(f"  {name:<24} {results[name]['min_s'] * 1000:>10.1f} ms", flush=True)
+        return value
+
+    # Loading, split into the steps parse_sales_csv chains together
+    raw = stage("read_csv", lambda: pd.read_csv(path), heavy)
+    stage("date_cleanup", lambda: engine.prepare_rows(raw.drop(columns=engine.MONEY_COLUMNS).copy()), heavy)
+    stage("numeric_cleanup", lambda: engine.normalize_currency(raw[engine.MONEY_COLUMNS].copy()), heavy)
+    normalized = engine.normalize_currency(raw.copy())
+    stage("apply_schema", lambda: engine.apply_schema(normalized.copy()), heavy)
+    raw = normalized = None
+    df, report, sources = stage("parse_chunked", lambda: engine.parse_sales_csv(path), heavy)
+    stage("snapshot_write", lambda: engine.write_snapshot(df, report, sources, path), heavy)
+    stage("snapshot_read", lambda: engine.read_snapshot(path), heavy)
+
+    # Per-version aggregates
+    cube = stage("build_cube", lambda: engine.build_cube(df))
+    index = stage("build_filter_index", lambda: engine.build_filter_index(df))
+    calendar = stage("build_calendar", lambda: engine.build_calendar(df))
+    dataset = engine.SalesDataset(df, 1, sources, report, cube, index, calendar)
+
+    # Filter block: one country, one product, one year
+    country = cube["Country"].value_counts().index[0]
+    product = cube["Product"].value_counts().index[0]
+    year = int(cube["Year"].max())
+    columns = ["Revenue", "Profit", "Country", "Currency"]
+    stage("filter_index", lambda: dataset.select(columns, Country=country, Product=product, Year=year))
+    stage("filter_mask", lambda: df.loc[
+        (df["Country"] == country) & (df["Product"] == product) & (df["Date"].dt.year == year), columns
+    ])
+    stage("reporting_currency", lambda: engine.to_reporting_currency(df[columns], "EUR"))
+
+    # Page builders
+    home = stage("home_results", lambda: engine.home_results(dataset, engine.BASE_CURRENCY))
+    dashboard = stage("dashboard_results", lambda: engine.dashboard_results(
+        dataset, "All", "All", "All", False, engine.BASE_CURRENCY
+    ))
+    stage("dashboard_compare", lambda: engine.dashboard_results(
+        dataset, list(cube["Country"].cat.categories[:2]), [product], [year], True, engine.BASE_CURRENCY
+    ))
+    settings = (engine.SCATTER_WEBGL_ROWS, engine.SCATTER_REDUCE_ROWS, engine.SCATTER_SAMPLE_SIZE, engine.SCATTER_METHODS[0])
+    scatter_rows = engine.to_reporting_currency(dataset.select(columns), engine.BASE_CURRENCY).dropna(subset=["Revenue", "Profit"])
+    points = stage("scatter_points", lambda: engine.scatter_points(scatter_rows, "Revenue", "Profit", settings))
+    stage("scatter_figure", lambda: charts.scatter_figure(points, "Revenue", "Profit"))
+    stage("home_trend_figure", lambda: charts.home_trend_figure(home["trend"]))
+    stage("home_scatter_figure", lambda: charts.home_scatter_figure(points, "Revenue", "Profit"))
+    stage("home_age_figure", lambda: charts.home_age_figure(home["age_df"]))
+    stage("home_category_figure", lambda: charts.home_category_figure(home["cat_df"]))
+    stage("home_map_figure", lambda: charts.home_map_figure(home["map_df"]))
+    stage("dashboard_scatter_figure", lambda: charts.dashboard_scatter_figure(points, "Revenue", "Profit"))
+    stage("trend_figure", lambda: charts.trend_figure(dashboard["trend"], False))
+    stage("age_figure", lambda: charts.age_figure(dashboard["age_df"]))
+    stage("category_figure", lambda: charts.category_figure(dashboard["category_df"]))
+    stage("map_figure", lambda: charts.map_figure(dashboard["map_df"]))
+    first, last = calendar["days"][0].astype(object), calendar["days"][-1].astype(object)
+    stage("calendar_range", lambda: engine.range_totals(calendar, first, last, engine.BASE_CURRENCY))
+    stage("document_sort_search", lambda: engine.table_positions(dataset, "Revenue", False, None, None, "road"))
+    return {"rows": rows, "source_bytes": os.path.getsize(path), "stages": results}
+
+
+# ============ REPORT ============ #
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    old_scales = {scale["rows"]: scale for scale in baseline["scales"]}
+    for scale in current["scales"]:
+        old = old_scales.get(scale["rows"])
+        if old is None:
+            continue
+        print(f"\n{scale['rows']:,} rows vs {baseline.get('commit') or 'baseline'}")
+        for name, stats in scale["stages"].items():
+            before = old["stages"].get(name)
+            if before:
+                ratio = stats["min_s"] / before["min_s"] if before["min_s"] else float("inf")
+                print(f"  {name:<24} {ratio:>6.2f}x")
+
+
+def main():
+    # sales_engine resolves exchange_rates.csv and .cache relative to the repo
+    # root; only a benchmark run moves there, not an import from the tests
+    os.chdir(ROOT)
+    parser = argparse.ArgumentParser(description="Time each data and page stage of the dashboard.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "scales": [],
+    }
+    for rows in args.rows:
+        print(f"{rows:,} rows")
+        report["scales"].append(run_scale(rows, args.repeat, args.seed))
+
+    output = args.output or os.path.join(BENCH_DIR, f"results-{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
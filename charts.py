@@ -0,0 +1,358 @@
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Plotly figure builders for the Home and Dashboard pages, kept apart from the
+# page script so benchmark.py can time them without running Streamlit.
+
+# =============================
+# PLOTLY GLOBAL STYLE
+# =============================
+PLOTLY_LAYOUT = dict(
+    height=420,
+    margin=dict(l=40, r=40, t=60, b=40),
+    paper_bgcolor="rgba(0,0,0,0)",
+    plot_bgcolor="rgba(0,0,0,0)",
+    font=dict(
+        family="Segoe UI",
+        size=13,
+        color="#1e293b"
+    ),
+    title=dict(
+        font=dict(size=18, color="#15264d")
+    )
+)
+
+COLOR_PALETTE = [
+    "#5b5dd8",
+    "#6366f1",
+    "#7dd3fc",
+    "#22c55e",
+    "#f59e0b",
+    "#ef4444"
+]
+
+# ============ FIGURES ============ #
+def scatter_figure(points, x, y, title=None):
+    fig = px.scatter(
+        points["rows"],
+        x=x,
+        y=y,
+        color="Country",
+        title=title,
+        color_discrete_sequence=COLOR_PALETTE,
+        render_mode=points["mode"]
+    )
+    if points["density"] is not None:
+        fig.add_trace(go.Heatmap(
+            x=points["density"]["x"],
+            y=points["density"]["y"],
+            z=points["density"]["z"],
+            colorscale=["#e0e7ff", "#6366f1", "#1e3a8a"],
+            showscale=False,
+            hovertemplate="Orders: %{z:,.0f}<extra></extra>"
+        ))
+        # Keep the outlier markers drawn on top of the density layer
+        fig.data = fig.data[-1:] + fig.data[:-1]
+    return fig
+
+
+def trend_figure(trend, compare_mode):
+    fig = px.line(
+        trend,
+        x="Date",
+        y="Revenue",
+        color="Country",
+        title="Revenue Trend (Comparison)" if compare_mode else "Revenue Trend"
+    )
+    fig.update_layout(
+        height=360,   
+        margin=dict(
+            l=80,
+            r=80,
+            t=20,
+            b=140
+        ),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        legend=dict(
+            orientation="v",
+            yanchor="top",
+            y=0.98,
+            xanchor="left",
+            x=1.02,
+            bgcolor="rgba(255,255,255,0)",
+            font=dict(size=12)
+        )
+    )
+    fig.update_layout(
+        legend=dict(
+            orientation="h",
+            y=-0.28,
+            x=0.5,
+            xanchor="center"
+        ),
+        height=340
+    )
+    fig.update_xaxes(
+        showgrid=False,
+        fixedrange=True 
+    )
+    fig.update_yaxes(
+        showgrid=True,
+        fixedrange=True
+    )
+    return fig
+
+
+def age_figure(age_df):
+    fig_bar = px.bar(
+        age_df,
+        x="Age_Group",
+        y="Revenue",
+        text_auto=".2s",
+        title="Revenue by Age Group"
+    )
+    fig_bar.update_layout(
+        height=330,
+        margin=dict(l=20, r=60, t=30, b=120),  
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        title_font=dict(size=20),
+    )
+    fig_bar.update_traces(
+        textposition="inside",
+        textfont=dict(size=14, color="white"),
+        cliponaxis=True 
+    )
+    fig_bar.update_xaxes(
+        tickangle=-25,
+        automargin=True, 
+        fixedrange=True
+    )
+    fig_bar.update_yaxes(
+        automargin=True,
+        fixedrange=True
+    )
+    return fig_bar
+
+
+def category_figure(category_df):
+    fig_pie = px.pie(
+        category_df,
+        names="Product_Category",
+        values="Revenue",
+        hole=0.45,
+        title="Revenue by Product Category",
+        color_discrete_sequence=COLOR_PALETTE
+    )
+    fig_pie.update_layout(
+        height=330,
+        margin=dict(l=40, r=100, t=30, b=110),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        title_font=dict(size=20),
+        legend=dict(
+            orientation="h",
+            y=-0.25,         
+            x=0.5,
+            xanchor="center",
+            font=dict(size=13)
+        )
+    )
+    fig_pie.update_traces(
+        textinfo="percent",
+        textposition="inside",
+        hole=0.45
+    )
+    return fig_pie
+
+
+def map_figure(map_df):
+    fig = px.choropleth(
+        map_df,
+        locations="Country",
+        locationmode="country names",
+        color="Revenue",
+        title="Sales Map Europe",
+        color_continuous_scale=[
+            "#e0f2fe",
+            "#38bdf8",
+            "#1e3a8a"
+        ]
+    )
+    fig.update_layout(
+        height=420,
+        margin=dict(l=60, r=30, t=50, b=25),
+
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+
+        geo=dict(
+            scope="europe",
+            projection_type="natural earth",
+            fitbounds="locations",
+
+            bgcolor="rgba(0,0,0,0)",
+
+            showframe=False,         
+            showcoastlines=False,
+            showcountries=True,
+            countrycolor="rgba(30,41,59,0.35)",
+
+            showland=True,
+            landcolor="rgba(203,213,225,0.35)",
+
+            lataxis=dict(showgrid=False),
+            lonaxis=dict(showgrid=False)
+        ),
+
+        coloraxis_colorbar=dict(
+            title="Revenue",
+            thickness=12,
+            len=0.55,
+            y=0.5,
+            outlinewidth=0       
+        ),
+
+        title=dict(
+            text="Sales Map Europe",
+            x=0.02,
+            y=0.95,
+            xanchor="left",
+            yanchor="top",
+            font=dict(size=22)
+        )
+    )
+    return fig
+
+
+def dashboard_scatter_figure(points, revenue_col, profit_col):
+    fig = scatter_figure(points, revenue_col, profit_col, title="Revenue vs Profit")
+    fig.update_layout(
+        height=370,
+        margin=dict(l=70, r=140, t=70, b=80),  # ⬅ ruang legend
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        title=dict(
+            text="Revenue vs Profit",
+            x=0.02,
+            y=0.9,
+            xanchor="left",
+            font=dict(size=22)
+        ),
+        legend=dict(
+            title="Country",
+            orientation="v",
+            x=0.98,              
+            y=0.5,
+            xanchor="left",
+            yanchor="middle",
+            font=dict(size=13),
+            bgcolor="rgba(0,0,0,0)"
+        )
+    )
+    # Axis & grid 
+    fig.update_xaxes(
+        showgrid=True,
+        gridcolor="rgba(120,120,140,0.25)",
+        zeroline=False,
+        linecolor="rgba(120,120,140,0.6)",
+        tickfont=dict(color="#555"),
+        fixedrange=True
+    )
+    fig.update_yaxes(
+        showgrid=True,
+        gridcolor="rgba(120,120,140,0.25)",
+        zeroline=False,
+        linecolor="rgba(120,120,140,0.6)",
+        tickfont=dict(color="#555"),
+        fixedrange=True
+    )
+    # Marker
+    fig.update_traces(
+        marker=dict(
+            size=10,
+            opacity=0.85,
+            line=dict(width=1, color="rgba(0,0,0,0.35)")
+        ),
+        selector=lambda trace: trace.type != "heatmap"
+    )
+    return fig
+
+
+# Compact versions for the Home page cards
+def home_trend_figure(trend):
+    fig = px.line(trend, x="Date", y="Revenue")
+    fig.update_layout(
+        height=160,
+        margin=dict(l=32, r=60, t=10, b=78),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)"
+    )
+    return fig
+
+
+def home_scatter_figure(points, revenue_col, profit_col):
+    fig = scatter_figure(points, revenue_col, profit_col)
+    fig.update_layout(
+        height=160,
+        margin=dict(l=12, r=26, t=10, b=70),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+    )
+    return fig
+
+
+def home_age_figure(age_df):
+    fig = px.bar(age_df, x="Age_Group", y="Revenue")
+    fig.update_layout(
+        height=155,
+        margin=dict(l=82, r=90, t=25, b=88),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)"
+    )
+    return fig
+
+
+def home_category_figure(cat_df):
+    fig = px.pie(
+        cat_df,
+        names="Product_Category",
+        values="Revenue",
+        hole=0.48,
+        color_discrete_sequence=COLOR_PALETTE
+    )
+    fig.update_layout(
+        height=155,
+        margin=dict(l=10, r=150, t=0.9, b=30),
+        paper_bgcolor="rgba(0,0,0,0)",
+        showlegend=True
+    )
+    fig.update_traces(textfont_size=9)
+    return fig
+
+
+def home_map_figure(map_df):
+    fig = px.choropleth(
+        map_df,
+        locations="Country",
+        locationmode="country names",
+        color="Revenue",
+        scope="europe",
+        color_continuous_scale=["#bfdbfe", "#6366f1", "#1e3a8a"]
+    )
+    fig.update_layout(
+        height=155,
+        margin=dict(l=8, r=8, t=0, b=10),
+        paper_bgcolor="rgba(0,0,0,0)",
+        coloraxis_colorbar=dict(
+            title_font=dict(size=9),
+            tickfont=dict(size=8)
+        )
+    )
+    fig.update_geos(
+        bgcolor="rgba(0,0,0,0)",
+        showframe=False,
+        showcoastlines=False
+    )
+    return fig
@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import random
+import resource
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+# Usage:
+#   python loadtest.py                           1, 5, 10 and 25 sessions
+#   python loadtest.py --sessions 2 8 --steps 30 --output load.json
+# Every session is a headless AppTest of app.py in this process, so they
+# share the same dataset store and result cache as sessions on one server.
+# AppTest swaps the process-wide Runtime instance on every run, so two runs at
+# once trample each other (KeyError('$$ID-...')); sessions therefore take
+# turns. Latencies are each rerun's own script time and the wait for a turn is
+# reported apart: the numbers approximate one server working through the same
+# reruns one at a time, not truly parallel load.
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(ROOT, "app.py")
+DEFAULT_SESSIONS = [1, 5, 10, 25]
+RUN_TIMEOUT = 300
+RSS_SAMPLE_SECONDS = 0.05
+RUN_LOCK = threading.Lock()
+SEARCH_TERMS = ["road", "bike", "helmet", "germany", "tire", "adults"]
+
+
+# ============ CLICK PATHS ============ #
+def widget(items, label):
+    for item in items:
+        if item.label == label:
+            return item
+    raise LookupError(label)
+
+
+def sidebar_click(at, label):
+    widget(at.sidebar.button, label).click()
+
+
+def browse_home(at, rng):
+    sidebar_click(at, "Overview Home")
+    yield
+
+
+def dashboard_filters(at, rng):
+    sidebar_click(at, "Detailed")
+    yield
+    country = widget(at.selectbox, "Country")
+    country.set_value(rng.choice(country.options))
+    yield
+    year = widget(at.selectbox, "Year")
+    year.set_value(int(rng.choice(year.options[1:])))
+    yield
+
+
+def dashboard_compare(at, rng):
+    sidebar_click(at, "Detailed")
+    yield
+    at.toggle[0].set_value(True)
+    yield
+    country = widget(at.multiselect, "Country")
+    country.set_value(rng.sample(country.options, rng.randint(2, 3)))
+    yield
+    year = widget(at.multiselect, "Year")
+    year.set_value([int(value) for value in rng.sample(year.options, rng.randint(1, 2))])
+    yield
+    at.toggle[0].set_value(False)
+    yield
+
+
+def calendar_range(at, rng):
+    sidebar_click(at, "Calendar")
+    yield
+    picker = at.date_input[0]
+    first, last = picker.min, picker.max
+    span = (last - first).days
+    start = first + timedelta(days=rng.randint(0, span))
+    end = min(last, start + timedelta(days=rng.randint(1, 365)))
+    picker.set_value([start, end])
+    yield
+    if rng.random() < 0.3:
+        at.toggle[0].set_value(True)
+        yield
+
+
+def document_search(at, rng):
+    sidebar_click(at, "Document")
+    yield
+    widget(at.text_input, "Search").input(rng.choice(SEARCH_TERMS))
+    yield
+
+
+def settings_currency(at, rng):
+    sidebar_click(at, "⚙️ Settings")
+    yield
+    currency = widget(at.selectbox, "Reporting Currency")
+    currency.set_value(rng.choice(currency.options))
+    yield
+
+
+# Weights roughly follow how people use the app: mostly the dashboard
+CLICK_PATHS = [
+    (browse_home, 3),
+    (dashboard_filters, 4),
+    (dashboard_compare, 3),
+    (calendar_range, 2),
+    (document_search, 2),
+    (settings_currency, 1),
+]
+
+
+# ============ SESSIONS ============ #
+def run_session(seed, steps, latencies, waits, errors):
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT)
+    reruns = 0
+
+    def rerun():
+        queued = time.perf_counter()
+        with RUN_LOCK:
+            start = time.perf_counter()
+            at.run()
+            latencies.append(time.perf_counter() - start)
+        waits.append(start - queued)
+        if at.exception:
+            errors.append(at.exception[0].value)
+
+    rerun()
+    while reruns < steps:
+        path = rng.choices([path for path, _ in CLICK_PATHS], [weight for _, weight in CLICK_PATHS])[0]
+        try:
+            for _ in path(at, rng):
+                rerun()
+                reruns += 1
+        except (LookupError, ValueError) as error:
+            # The widget this path expects was not on the page; start a new path
+            errors.append(f"{path.__name__}: {error!r}")
+            rerun()
+
+
+def session_worker(seed, steps, latencies, waits, errors, completed):
+    # Any failure ends only this session, and is counted rather than lost
+    # with the thread
+    try:
+        run_session(seed, steps, latencies, waits, errors)
+    except Exception as error:
+        errors.append(f"session {seed}: {error!r}")
+    else:
+        completed.append(seed)
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is the lifetime peak in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    def __init__(self):
+        self.peak = rss_bytes()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.done.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+
+
+def cache_stats():
+    # Read the result cache counters the same way a user would, from Settings
+    at = AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT)
+    at.session_state["page"] = "Settings"
+    at.run()
+    hits, misses = widget(at.metric, "Hits / Misses").value.replace(",", "").split(" / ")
+    return int(hits), int(misses)
+
+
+def run_level(sessions, steps, seed):
+    latencies = []
+    waits = []
+    errors = []
+    completed = []
+    before = cache_stats()
+    start = time.perf_counter()
+    with RssSampler() as sampler:
+        threads = [
+            threading.Thread(target=session_worker, args=(seed + i, steps, latencies, waits, errors, completed))
+            for i in range(sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    after = cache_stats()
+
+    hits = after[0] - before[0]
+    misses = after[1] - before[1]
+    times = np.array(latencies) * 1000
+    return {
+        "sessions": sessions,
+        "sessions_completed": len(completed),
+        "sessions_failed": sessions - len(completed),
+        "reruns": len(latencies),
+        "elapsed_s": elapsed,
+        "reruns_per_s": len(latencies) / elapsed if elapsed else 0,
+        "p50_ms": float(np.percentile(times, 50)) if len(times) else None,
+        "p95_ms": float(np.percentile(times, 95)) if len(times) else None,
+        "p99_ms": float(np.percentile(times, 99)) if len(times) else None,
+        "max_ms": float(times.max()) if len(times) else None,
+        "wait_p95_ms": float(np.percentile(waits, 95) * 1000) if waits else None,
+        "peak_rss_mb": sampler.peak / 1024 ** 2,
+        "cache_hits": hits,
+        "cache_misses": misses,
+        "cache_hit_rate": hits / (hits + misses) if hits + misses else None,
+        "errors": len(errors),
+        "error_samples": sorted(set(map(str, errors)))[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent headless sessions through app.py.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS)
+    parser.add_argument("--steps", type=int, default=20, help="reruns per session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    # Warm the shared dataset once so the first level does not time the cold load
+    AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT).run()
+
+    levels = []
+    print(f"{'sessions':>8} {'done':>5} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'wait p95':>9} {'peak RSS':>9} {'hit rate':>9} {'errors':>6}")
+    for sessions in args.sessions:
+        level = run_level(sessions, args.steps, args.seed)
+        levels.append(level)
+        hit_rate = "-" if level["cache_hit_rate"] is None else f"{level['cache_hit_rate']:.0%}"
+        # A level where every session failed has no latencies to print
+        ms = {
+            key: "-" if level[key] is None else f"{level[key]:.0f}"
+            for key in ["p50_ms", "p95_ms", "p99_ms", "wait_p95_ms"]
+        }
+        print(f"{sessions:>8} {level['sessions_completed']:>5} {level['reruns']:>7} {ms['p50_ms']:>8} {ms['p95_ms']:>8} "
+              f"{ms['p99_ms']:>8} {ms['wait_p95_ms']:>9} {level['peak_rss_mb']:>7.0f}MB {hit_rate:>9} "
+              f"{level['errors']:>6}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"steps": args.steps, "seed": args.seed, "levels": levels}, f, indent=2)
+        print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1683 @@
+import contextvars
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache, reduce
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as pa_ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pa_csv = None
+    pa_ds = None
+    feather = None
+    pq = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Data loading, aggregation and query code shared by the Streamlit pages in
+# app.py, benchmark.py and the tests. Nothing here touches Streamlit, so
+# importing it loads no data and starts no threads.
+
+# ============ PERFORMANCE TIMING ============ #
+# Every page stage (load, filter, clean, aggregations, figure builds, chart
+# sends) is timed into one process-wide recorder. Settings shows the numbers;
+# metrics.prom (Prometheus text format) and perf.jsonl (one line per rerun)
+# are written for external dashboards.
+PERF_DIR = ".cache"
+PERF_PROM_PATH = os.path.join(PERF_DIR, "metrics.prom")
+PERF_JSONL_PATH = os.path.join(PERF_DIR, "perf.jsonl")
+PERF_JSONL_MAX_MB = 50
+PERF_PROM_INTERVAL = 5
+PERF_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+PERF_RECENT = 500
+
+
+# Filter values can be numpy scalars or dates
+def json_value(value):
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def prom_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class PerfRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.reruns = deque(maxlen=PERF_RECENT)
+        self.prom_written = 0
+
+    def observe(self, page, stage, seconds):
+        with self.lock:
+            entry = self.stats.get((page, stage))
+            if entry is None:
+                entry = self.stats[(page, stage)] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "max": 0.0,
+                    "buckets": [0] * len(PERF_BUCKETS),
+                    "recent": deque(maxlen=PERF_RECENT),
+                }
+            entry["count"] += 1
+            entry["sum"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["recent"].append(seconds)
+            for i, bound in enumerate(PERF_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+
+    def finish_rerun(self, page, version, seconds, stages, filters=None, fragment=None):
+        self.observe(page, "rerun", seconds)
+        record = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "page": page,
+            "version": version,
+            "fragment": fragment,
+            "seconds": round(seconds, 6),
+            "filters": filters or {},
+            "stages": {name: round(value, 6) for name, value in stages},
+        }
+        with self.lock:
+            self.reruns.append(record)
+        try:
+            os.makedirs(PERF_DIR, exist_ok=True)
+            with self.lock:
+                if os.path.exists(PERF_JSONL_PATH) and os.path.getsize(PERF_JSONL_PATH) > PERF_JSONL_MAX_MB * 1024 ** 2:
+                    os.replace(PERF_JSONL_PATH, PERF_JSONL_PATH + ".1")
+                with open(PERF_JSONL_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=json_value) + "\n")
+            if time.time() - self.prom_written >= PERF_PROM_INTERVAL:
+                self.write_prometheus()
+        except OSError:
+            pass
+
+    def prometheus(self):
+        lines = [
+            "# HELP velocia_stage_seconds Time spent in each page stage; stage=\"rerun\" is the whole rerun.",
+            "# TYPE velocia_stage_seconds histogram",
+        ]
+        with self.lock:
+            items = sorted(self.stats.items())
+            for (page, stage), entry in items:
+                labels = f'page="{prom_label(page)}",stage="{prom_label(stage)}"'
+                for bound, count in zip(PERF_BUCKETS, entry["buckets"]):
+                    lines.append(f'velocia_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'velocia_stage_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+                lines.append(f"velocia_stage_seconds_sum{{{labels}}} {entry['sum']:.6f}")
+                lines.append(f"velocia_stage_seconds_count{{{labels}}} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        self.prom_written = time.time()
+        with open(PERF_PROM_PATH + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(PERF_PROM_PATH + ".tmp", PERF_PROM_PATH)
+
+    def summary(self):
+        with self.lock:
+            rows = [
+                {
+                    "Page": page,
+                    "Stage": stage,
+                    "Count": entry["count"],
+                    "Mean (ms)": entry["sum"] / entry["count"] * 1000,
+                    "p95 (ms)": float(np.percentile(entry["recent"], 95)) * 1000,
+                    "Max (ms)": entry["max"] * 1000,
+                    "Total (s)": entry["sum"],
+                }
+                for (page, stage), entry in self.stats.items()
+            ]
+        return pd.DataFrame(rows)
+
+    def clear(self):
+        with self.lock:
+            self.stats.clear()
+            self.reruns.clear()
+
+
+# One recorder per process; the module is imported once and shared by every session
+perf = PerfRecorder()
+# The rerun being timed on this thread. app.py opens one at the top of the
+# script and finishes it in the router, or around a fragment rerun. Stages
+# recorded without an explicit page go to the open rerun's page; pages tag
+# the rerun with their filter state through perf_filters.
+perf_active = contextvars.ContextVar("perf_active", default=None)
+
+
+def perf_begin(page, fragment=None):
+    run = {"start": time.perf_counter(), "page": page, "stages": [], "filters": {}, "fragment": fragment}
+    perf_active.set(run)
+    return run
+
+
+def perf_finish(run, version):
+    perf_active.set(None)
+    perf.finish_rerun(
+        run["page"], version, time.perf_counter() - run["start"], run["stages"], run["filters"], run["fragment"]
+    )
+
+
+def perf_filters(**filters):
+    run = perf_active.get()
+    if run is not None:
+        run["filters"] = filters
+
+
+def perf_record(name, seconds, page=None):
+    if page is None:
+        run = perf_active.get()
+        if run is None:
+            page = "other"
+        else:
+            page = run["page"]
+            run["stages"].append((name, seconds))
+    perf.observe(page, name, seconds)
+
+
+@contextmanager
+def perf_stage(name, page=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        perf_record(name, time.perf_counter() - start, page)
+
+
+# Splits one straight run of code into consecutive timed stages:
+#   laps = PerfLaps("home.trend"); ...build...; laps.lap("figure"); ...send...; laps.lap("send")
+class PerfLaps:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        perf_record(f"{self.prefix}.{name}", now - self.last)
+        self.last = now
+
+# ============ LOAD DATA ============ #
+DATA_PATH = "Sales.csv"
+# Daily POS drops placed next to Sales.csv, e.g. Sales_2024-05-01.csv
+DROP_PATTERN = "Sales_*.csv"
+SNAPSHOT_DIR = ".cache"
+# Bump when the parsed frame changes shape so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 5
+TAIL_BYTES = 4096
+
+
+def source_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def source_paths(path):
+    drops = glob.glob(os.path.join(os.path.dirname(path) or ".", DROP_PATTERN))
+    return [path] + sorted(drops)
+
+
+def sources_signature(path):
+    return {source: source_signature(source) for source in source_paths(path)}
+
+
+def tail_digest(f, offset):
+    start = max(0, offset - TAIL_BYTES)
+    f.seek(start)
+    return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+# The first size bytes of a file. A full parse reads through this, so it stops
+# at the offset its read state records even while a POS export appends rows;
+# those rows are picked up as a delta on the next pass instead of twice.
+class PrefixReader(io.RawIOBase):
+    def __init__(self, path, size):
+        self.file = open(path, "rb")
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.file.read(min(len(buffer), self.size - self.position))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+# Parses a whole source, or with a previous read state only the bytes appended
+# since then. Returns (None, None) when the file was rewritten rather than appended.
+def read_source(path, state=None):
+    signature = source_signature(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        if state is None:
+            offset = signature["size"]
+            data = None
+        else:
+            start = state["offset"]
+            f.seek(max(0, start - 1))
+            if (
+                signature["size"] <= start
+                or header.decode("utf-8") != state["header"]
+                or f.read(1) != b"\n"
+                or tail_digest(f, start) != state["tail"]
+            ):
+                return None, None
+            f.seek(start)
+            data = f.read(signature["size"] - start)
+            # A half-written last row is left for the next pass
+            data = data[:data.rfind(b"\n") + 1]
+            offset = start + len(data)
+        tail = tail_digest(f, offset)
+
+    state = {
+        **signature,
+        "offset": offset,
+        "header": header.decode("utf-8"),
+        "tail": tail,
+    }
+    if data is None:
+        with PrefixReader(path, offset) as f:
+            return pd.read_csv(f), state
+    return (pd.read_csv(io.BytesIO(header + data)) if data else None), state
+
+
+def snapshot_paths(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    base = os.path.join(SNAPSHOT_DIR, name)
+    return base + ".arrow", base + ".json"
+
+
+# ============ INGEST SCHEMA ============ #
+# Low-cardinality dimensions are stored as categoricals so groupby, isin and
+# nunique work on integer codes; everything numeric is narrowed when lossless.
+CATEGORY_COLUMNS = [
+    "Country",
+    "State",
+    "Product",
+    "Product_Category",
+    "Sub_Category",
+    "Age_Group",
+    "Customer_Gender",
+    "Month",
+    "Currency",
+]
+
+
+def compact_column(series):
+    if series.name in CATEGORY_COLUMNS:
+        return series.astype("category")
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series):
+        narrow = series.astype("float32")
+        if narrow.astype(series.dtype).equals(series):
+            return narrow
+    return series
+
+
+def apply_schema(df):
+    report = []
+    for col in df.columns:
+        before = int(df[col].memory_usage(index=False, deep=True))
+        df[col] = compact_column(df[col])
+        after = int(df[col].memory_usage(index=False, deep=True))
+        report.append({
+            "Column": col,
+            "Dtype": str(df[col].dtype),
+            "Before": before,
+            "After": after,
+            "Saved": before - after,
+        })
+    return df, report
+
+
+# ============ CURRENCY ============ #
+BASE_CURRENCY = "USD"
+EXCHANGE_RATES_PATH = "exchange_rates.csv"
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP"}
+MONEY_COLUMNS = ["Revenue", "Cost", "Profit", "Unit_Cost", "Unit_Price"]
+
+
+def normalize_currency(df):
+    money_cols = [col for col in MONEY_COLUMNS if col in df.columns]
+    text_cols = [
+        col for col in money_cols
+        if not pd.api.types.is_numeric_dtype(df[col])
+    ]
+    # Tag each row with the currency of its first symbol-bearing amount
+    currency = pd.Series(BASE_CURRENCY, index=df.index)
+    for col in reversed(text_cols):
+        text = df[col].astype(str)
+        for symbol, code in CURRENCY_SYMBOLS.items():
+            currency = currency.mask(text.str.contains(symbol, regex=False), code)
+    for col in text_cols:
+        df[col] = pd.to_numeric(
+            df[col].astype(str).str.replace(r"[^0-9.\-]", "", regex=True),
+            errors="coerce"
+        )
+    df["Currency"] = currency
+    return df
+
+
+@lru_cache(maxsize=None)
+def load_exchange_rates(path=EXCHANGE_RATES_PATH):
+    # Units of BASE_CURRENCY per one unit of each currency
+    rates = {BASE_CURRENCY: 1.0}
+    if os.path.exists(path):
+        table = pd.read_csv(path)
+        rates.update(zip(table["Currency"], table["Rate"].astype(float)))
+    return rates
+
+
+def currency_symbol(code):
+    for symbol, symbol_code in CURRENCY_SYMBOLS.items():
+        if symbol_code == code:
+            return symbol
+    return f"{code} "
+
+
+def currency_factors(codes, target):
+    rates = load_exchange_rates()
+    return np.array(
+        [rates.get(code, np.nan) for code in codes], dtype="float64"
+    ) / rates.get(target, np.nan)
+
+
+def to_reporting_currency(df, target):
+    money_cols = [col for col in MONEY_COLUMNS if col in df.columns]
+    if "Currency" not in df.columns or not money_cols:
+        return df
+    present = df["Currency"].cat.categories
+    if len(present) == 1 and present[0] == target:
+        return df
+    # One factor per category, then a single take() over the codes
+    factors = currency_factors(present, target)
+    row_factor = np.append(factors, np.nan)[df["Currency"].cat.codes.to_numpy()]
+    return df.assign(**{col: df[col].to_numpy() * row_factor for col in money_cols})
+
+
+# ============ CSV READER ============ #
+# Cold starts read the CSV in blocks: pyarrow parses each block on several
+# threads, and dates, currencies and categoricals are converted per chunk on a
+# worker pool while the next block is read, with progress shown in the UI.
+CSV_READER = os.environ.get("VELOCIA_CSV_READER", "arrow")
+CSV_BLOCK_BYTES = 32 * 1024 * 1024
+CSV_CHUNK_ROWS = 250_000
+CSV_WORKERS = os.cpu_count() or 1
+
+
+def prepare_rows(df):
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    # Rows stay sorted by Date so date ranges resolve by binary search
+    df = df.dropna(subset=["Date"]).sort_values("Date", kind="stable").reset_index(drop=True)
+    return normalize_currency(df)
+
+
+def prepare_chunk(raw):
+    raw["Date"] = pd.to_datetime(raw["Date"], errors="coerce")
+    return apply_schema(normalize_currency(raw.dropna(subset=["Date"])))
+
+
+def full_state(path):
+    signature = source_signature(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        tail = tail_digest(f, signature["size"])
+    return {
+        **signature,
+        "offset": signature["size"],
+        "header": header.decode("utf-8"),
+        "tail": tail,
+    }
+
+
+# Yields raw chunks of the first size bytes with the number of bytes read so far
+def csv_chunks(path, size, reader=CSV_READER):
+    if reader == "arrow" and pa_csv is not None:
+        columns = list(pd.read_csv(path, nrows=0).columns)
+        # Amounts carry currency symbols and dates may be malformed; both are
+        # parsed per chunk instead of trusting type inference on the first block
+        text_cols = [col for col in ["Date"] + MONEY_COLUMNS if col in columns]
+        with PrefixReader(path, size) as stream:
+            batches = pa_csv.open_csv(
+                stream,
+                read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_BYTES, use_threads=True),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={col: pa.string() for col in text_cols},
+                    strings_can_be_null=True
+                )
+            )
+            # The reader prefetches ahead, so progress counts blocks handed out
+            # (one batch per block) rather than the stream position
+            for i, batch in enumerate(batches, 1):
+                yield batch.to_pandas(), min(i * CSV_BLOCK_BYTES, size)
+        return
+    with PrefixReader(path, size) as f:
+        for chunk in pd.read_csv(f, chunksize=CSV_CHUNK_ROWS):
+            yield chunk, f.tell()
+
+
+def combine_chunks(chunks, reports):
+    chunks = [chunk for chunk in chunks if len(chunk)] or chunks[:1]
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            # Union keeps categories sorted, so code order stays label order
+            categories = reduce(
+                lambda left, right: left.union(right),
+                [chunk[col].cat.categories for chunk in chunks]
+            )
+            chunks = [
+                chunk.assign(**{col: chunk[col].cat.set_categories(categories)})
+                for chunk in chunks
+            ]
+    df = pd.concat(chunks, ignore_index=True)
+    df = df.sort_values("Date", kind="stable").reset_index(drop=True)
+
+    report = []
+    for col in df.columns:
+        before = sum(entry["Before"] for part in reports for entry in part if entry["Column"] == col)
+        after = int(df[col].memory_usage(index=False, deep=True))
+        report.append({
+            "Column": col,
+            "Dtype": str(df[col].dtype),
+            "Before": before,
+            "After": after,
+            "Saved": before - after,
+        })
+    return df, report
+
+
+# Reads each source up to the offset in its read state
+def read_chunked(sources, progress=None, reader=CSV_READER):
+    total = sum(state["offset"] for state in sources.values()) or 1
+    done = 0
+    futures = []
+    with ThreadPoolExecutor(max_workers=CSV_WORKERS) as pool:
+        for source, state in sources.items():
+            for raw, read in csv_chunks(source, state["offset"], reader):
+                futures.append(pool.submit(prepare_chunk, raw))
+                if progress:
+                    progress(min((done + read) / total, 1.0), f"Reading {os.path.basename(source)}…")
+            done += state["offset"]
+        parts = [future.result() for future in futures]
+    return combine_chunks([chunk for chunk, _ in parts], [report for _, report in parts])
+
+
+def parse_sales_csv(path, progress=None, reader=CSV_READER):
+    sources = {source: full_state(source) for source in source_paths(path)}
+    try:
+        df, report = read_chunked(sources, progress, reader)
+    except pa.ArrowInvalid if pa is not None else ():
+        # Type inference from the first block did not hold for a later one
+        df, report = read_chunked(sources, progress, reader="pandas")
+    return df, report, sources
+
+
+def read_snapshot(path):
+    if feather is None:
+        return None, None, None
+    data_path, meta_path = snapshot_paths(path)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("format") != SNAPSHOT_FORMAT or path not in meta.get("sources", {}):
+            return None, None, None
+        # Uncompressed Arrow IPC can be memory-mapped instead of read into a buffer
+        df = feather.read_table(data_path, memory_map=True).to_pandas()
+        return df, meta.get("schema", []), meta["sources"]
+    except (OSError, ValueError, pa.ArrowException):
+        return None, None, None
+
+
+def write_snapshot(df, report, sources, path):
+    if feather is None:
+        return
+    data_path, meta_path = snapshot_paths(path)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, data_path + ".tmp", compression="uncompressed")
+        os.replace(data_path + ".tmp", data_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"format": SNAPSHOT_FORMAT, "sources": sources, "schema": report}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+    except (OSError, pa.ArrowException):
+        # A read-only checkout still works, it just re-parses the CSV
+        pass
+
+
+# The snapshot records how far each source was read; anything appended since
+# is caught up incrementally by the dataset store.
+def load_data(path=DATA_PATH, fresh=False, progress=None):
+    df, report, sources = (None, None, None) if fresh else read_snapshot(path)
+    if df is None:
+        df, report, sources = parse_sales_csv(path, progress)
+        write_snapshot(df, report, sources, path)
+    return df, report, sources
+
+# ============ SALES CUBE ============ #
+# Month x filter dimensions, pre-summed once per dataset version. Pages answer
+# KPIs, charts and insights from this instead of grouping raw rows.
+CUBE_DIMENSIONS = ["Country", "Product", "Age_Group", "Product_Category", "Currency"]
+
+
+def detect_column(df, keywords):
+    for col in df.columns:
+        for key in keywords:
+            if key.lower() in col.lower():
+                return col
+    return None
+
+
+def build_cube(df):
+    revenue_col = detect_column(df, ["revenue", "sales", "amount"])
+    profit_col = detect_column(df, ["profit"])
+    quantity_col = detect_column(df, ["quantity"])
+    dims = [col for col in CUBE_DIMENSIONS if col in df.columns]
+
+    valid = df[revenue_col].notna() & df[profit_col].notna()
+    rows = df.loc[valid, dims + [col for col in [revenue_col, profit_col, quantity_col] if col]]
+    month = df.loc[valid, "Date"].dt.to_period("M").dt.to_timestamp().rename("Month")
+
+    measures = {
+        "Revenue": (revenue_col, "sum"),
+        "Profit": (profit_col, "sum"),
+        "Orders": (revenue_col, "size"),
+    }
+    if quantity_col:
+        measures["Quantity"] = (quantity_col, "sum")
+    cube = (
+        rows
+        # Rows missing a dimension still count toward every total; the chart
+        # groupbys drop the NaN label when they break totals down
+        .groupby([month] + dims, observed=True, dropna=False)
+        .agg(**measures)
+        .reset_index()
+    )
+    cube["Year"] = cube["Month"].dt.year
+    return cube
+
+
+def slice_cube(cube, country="All", product="All", year="All"):
+    mask = np.ones(len(cube), dtype=bool)
+    for col, value in [("Country", country), ("Product", product), ("Year", year)]:
+        if isinstance(value, list):
+            mask &= cube[col].isin(value).to_numpy()
+        elif value != "All":
+            mask &= (cube[col] == value).to_numpy()
+    return cube[mask]
+
+
+# ============ FILTER INDEX ============ #
+# Per-value sorted row positions for each filterable dimension, so a filter
+# selection is a union/intersection of small arrays instead of column scans.
+FILTER_DIMENSIONS = ["Country", "Product", "Year"]
+
+
+def index_positions(codes, labels):
+    order = np.argsort(codes, kind="stable").astype(np.int32)
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    return {
+        label: order[bounds[i]:bounds[i + 1]]
+        for i, label in enumerate(labels)
+    }
+
+
+def build_filter_index(df):
+    index = {}
+    for dim in FILTER_DIMENSIONS:
+        if dim == "Year":
+            codes, labels = pd.factorize(df["Date"].dt.year, sort=True)
+        elif dim in df.columns:
+            codes = df[dim].cat.codes.to_numpy()
+            labels = df[dim].cat.categories
+        else:
+            continue
+        index[dim] = index_positions(np.asarray(codes), list(labels))
+    return index
+
+
+def select_rows(index, **selection):
+    parts = []
+    for dim, value in selection.items():
+        if not isinstance(value, list) and value == "All":
+            continue
+        values = value if isinstance(value, list) else [value]
+        if not values:
+            # An emptied multiselect selects nothing, like isin([])
+            parts.append(np.empty(0, dtype=np.int32))
+            continue
+        matches = [index[dim].get(v, np.empty(0, dtype=np.int32)) for v in values]
+        parts.append(matches[0] if len(matches) == 1 else np.sort(np.concatenate(matches)))
+    if not parts:
+        return None
+    # Intersect smallest first so later steps work on the shortest arrays
+    parts.sort(key=len)
+    positions = parts[0]
+    for part in parts[1:]:
+        positions = np.intersect1d(positions, part, assume_unique=True)
+    return positions
+
+
+def take_rows(df, positions, columns):
+    cols = [df.columns.get_loc(col) for col in columns]
+    if positions is None:
+        return df.iloc[:, cols]
+    return df.iloc[positions, cols]
+
+
+# ============ CALENDAR INDEX ============ #
+# Daily prefix sums over the Date-sorted frame, one row per source currency,
+# so any date-range total is two binary searches and a subtraction.
+def build_calendar(df):
+    revenue_col = detect_column(df, ["revenue", "sales", "amount"])
+    profit_col = detect_column(df, ["profit"])
+    quantity_col = detect_column(df, ["quantity"])
+    day_values = df["Date"].to_numpy().astype("datetime64[D]")
+    days, first = np.unique(day_values, return_index=True)
+    offsets = np.append(first, len(df))
+
+    currency_codes = df["Currency"].cat.codes.to_numpy()
+    currencies = list(df["Currency"].cat.categories)
+    prefix = {}
+    for name, col in [("Revenue", revenue_col), ("Profit", profit_col), ("Quantity", quantity_col)]:
+        if not col or not len(df):
+            continue
+        values = np.nan_to_num(df[col].to_numpy(dtype="float64"))
+        daily = np.stack([
+            np.add.reduceat(np.where(currency_codes == i, values, 0.0), first)
+            for i in range(len(currencies))
+        ])
+        prefix[name] = np.concatenate([np.zeros((len(currencies), 1)), daily.cumsum(axis=1)], axis=1)
+    return {
+        "days": days,
+        "offsets": offsets,
+        "currencies": currencies,
+        "prefix": prefix,
+    }
+
+
+def range_totals(calendar, start, end, currency):
+    i = np.searchsorted(calendar["days"], np.datetime64(start, "D"), side="left")
+    j = np.searchsorted(calendar["days"], np.datetime64(end, "D"), side="right")
+    factors = currency_factors(calendar["currencies"], currency)
+    totals = {}
+    for name, prefix in calendar["prefix"].items():
+        window = prefix[:, j] - prefix[:, i]
+        totals[name] = float(window.sum() if name == "Quantity" else (window * factors).sum())
+    totals["Orders"] = int(calendar["offsets"][j] - calendar["offsets"][i])
+    totals["rows"] = (int(calendar["offsets"][i]), int(calendar["offsets"][j]))
+    return totals
+
+
+# ============ INCREMENTAL INGEST ============ #
+# Appended bytes and new drop files are parsed on their own and merged into
+# the frame, the cube, the filter index and the calendar of the last version.
+def read_deltas(path, sources):
+    current = sources_signature(path)
+    if set(sources) - set(current):
+        return None
+    frames = []
+    updated = dict(sources)
+    for source, signature in current.items():
+        state = sources.get(source)
+        if state is not None and signature == {"size": state["size"], "mtime_ns": state["mtime_ns"]}:
+            continue
+        raw, updated[source] = read_source(source, state)
+        if updated[source] is None:
+            return None
+        if raw is not None:
+            frames.append(raw)
+    return frames, updated
+
+
+def align_frames(base, delta):
+    delta = delta.reindex(columns=base.columns)
+    for col in base.columns:
+        if isinstance(base[col].dtype, pd.CategoricalDtype):
+            # Union keeps categories sorted, so code order stays label order
+            categories = base[col].cat.categories.union(pd.Index(delta[col].dropna().unique()))
+            if len(categories) != len(base[col].cat.categories):
+                base = base.assign(**{col: base[col].cat.set_categories(categories)})
+            delta[col] = pd.Categorical(delta[col], categories=categories)
+        elif col != "Date":
+            delta[col] = compact_column(delta[col])
+    return base, delta
+
+
+def merge_cube(cube, delta_cube):
+    dims = [col for col in CUBE_DIMENSIONS if col in cube.columns]
+    for col in dims:
+        cube = cube.assign(**{col: cube[col].cat.set_categories(delta_cube[col].cat.categories)})
+    measures = [col for col in cube.columns if col not in dims + ["Month", "Year"]]
+    merged = (
+        pd.concat([cube, delta_cube], ignore_index=True)
+        .groupby(["Month"] + dims, observed=True, dropna=False)[measures]
+        .sum()
+        .reset_index()
+    )
+    merged["Year"] = merged["Month"].dt.year
+    return merged
+
+
+def extend_filter_index(index, delta_index, offset):
+    merged = {}
+    for dim in set(index) | set(delta_index):
+        merged[dim] = dict(index.get(dim, {}))
+        for label, positions in delta_index.get(dim, {}).items():
+            previous = merged[dim].get(label, np.empty(0, dtype=np.int32))
+            merged[dim][label] = np.concatenate([previous, positions + offset]).astype(np.int32)
+    return merged
+
+
+def merge_calendar(calendar, delta_calendar):
+    days = np.union1d(calendar["days"], delta_calendar["days"])
+    currencies = sorted(set(calendar["currencies"]) | set(delta_calendar["currencies"]))
+    counts = np.zeros(len(days), dtype=np.int64)
+    daily = {}
+    for part in (calendar, delta_calendar):
+        at = np.searchsorted(days, part["days"])
+        counts[at] += np.diff(part["offsets"])
+        rows = [currencies.index(code) for code in part["currencies"]]
+        for name, prefix in part["prefix"].items():
+            daily.setdefault(name, np.zeros((len(currencies), len(days))))
+            daily[name][np.ix_(rows, at)] += np.diff(prefix, axis=1)
+    return {
+        "days": days,
+        "offsets": np.append(0, counts.cumsum()),
+        "currencies": currencies,
+        "prefix": {
+            name: np.concatenate([np.zeros((len(currencies), 1)), values.cumsum(axis=1)], axis=1)
+            for name, values in daily.items()
+        },
+    }
+
+
+def merge_delta(dataset, frames, sources):
+    delta = prepare_rows(pd.concat(frames, ignore_index=True)) if frames else None
+    if delta is None or delta.empty:
+        return SalesDataset(
+            dataset.df, dataset.version, sources, dataset.schema_report,
+            dataset.cube, dataset.filter_index, dataset.calendar
+        )
+
+    base, delta = align_frames(dataset.df, delta)
+    appended = base.empty or delta["Date"].iloc[0] >= base["Date"].iloc[-1]
+    df = pd.concat([base, delta], ignore_index=True)
+    if appended:
+        filter_index = extend_filter_index(dataset.filter_index, build_filter_index(delta), len(base))
+    else:
+        # Back-dated rows break the Date order; re-sort and re-index positions
+        df = df.sort_values("Date", kind="stable").reset_index(drop=True)
+        filter_index = None
+    return SalesDataset(
+        df,
+        dataset.version + 1,
+        sources,
+        dataset.schema_report,
+        merge_cube(dataset.cube, build_cube(delta)),
+        filter_index,
+        merge_calendar(dataset.calendar, build_calendar(delta)),
+    )
+
+
+def refresh_dataset(dataset, path):
+    deltas = read_deltas(path, dataset.sources)
+    if deltas is None:
+        return None
+    updated = merge_delta(dataset, *deltas)
+    if updated.version != dataset.version:
+        write_snapshot(updated.df, updated.schema_report, updated.sources, path)
+    return updated
+
+
+# ============ SHARED DATASET ============ #
+# One immutable frame per process, shared by every session and page.
+# Pages must never mutate dataset.df in place; derive new frames instead.
+class SalesDataset:
+    backend = "pandas"
+
+    def __init__(self, df, version, sources, schema_report, cube=None, filter_index=None, calendar=None):
+        self.df = df
+        self.version = version
+        self.sources = sources
+        self.signature = {
+            source: {"size": state["size"], "mtime_ns": state["mtime_ns"]}
+            for source, state in sources.items()
+        }
+        self.schema_report = schema_report
+        with perf_stage("ingest.cube", "ingest"):
+            self.cube = build_cube(df) if cube is None else cube
+        with perf_stage("ingest.filter_index", "ingest"):
+            self.filter_index = build_filter_index(df) if filter_index is None else filter_index
+        self.sort_orders = {}
+        with perf_stage("ingest.calendar", "ingest"):
+            self.calendar = build_calendar(df) if calendar is None else calendar
+        # Zero-row frame carrying the column names and dtypes
+        self.template = df.iloc[:0]
+
+    def __len__(self):
+        return len(self.df)
+
+    def select(self, columns, **selection):
+        return take_rows(self.df, select_rows(self.filter_index, **selection), columns)
+
+    def scatter_points(self, x, y, currency, settings, **selection):
+        laps = PerfLaps("scatter")
+        rows = self.select([x, y, "Country", "Currency"], **selection)
+        laps.lap("filter")
+        rows = to_reporting_currency(rows, currency).dropna(subset=[x, y])
+        laps.lap("clean")
+        return scatter_points(rows, x, y, settings)
+
+    def date_rows(self, start, stop):
+        return self.df.iloc[start:stop]
+
+
+# Rebuilds run on a background thread and are published by swapping
+# store.current in one assignment, so a rerun always works on one complete
+# version and never waits for a rebuild. Only the very first load blocks.
+REFRESH_INTERVAL = 30
+
+
+class RefreshWorker:
+    def __init__(self, store, interval=REFRESH_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self.wake = threading.Event()
+        self.force = False
+        self.busy = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="dataset-refresh", daemon=True)
+        self.thread.start()
+
+    def request(self, force=False):
+        self.force = self.force or force
+        self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            force, self.force = self.force, False
+            self.busy = True
+            try:
+                self.store.reload(force=force)
+                self.error = None
+            except Exception as error:
+                # Keep serving the last good version and retry on the next wake
+                self.error = error
+            finally:
+                self.busy = False
+
+
+class DatasetStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.current = None
+        self.worker = RefreshWorker(self)
+
+    def get(self, progress=None):
+        dataset = self.current
+        if dataset is None:
+            return self.reload(progress=progress)
+        if dataset.signature != sources_signature(self.path):
+            self.worker.request()
+        return dataset
+
+    def reload(self, force=False, progress=None):
+        with self.lock:
+            dataset = self.current
+            # Another session may have finished the same reload while we waited
+            if dataset is not None and dataset.signature == sources_signature(self.path) and not force:
+                return dataset
+            if dataset is not None and not force:
+                with perf_stage("ingest.refresh", "ingest"):
+                    updated = refresh_dataset(dataset, self.path)
+                if updated is not None:
+                    self.current = updated
+                    return updated
+
+            version = dataset.version + 1 if dataset else 1
+            # Past the refresh above the sources were rewritten, not appended
+            # to, so the snapshot is stale as well
+            fresh = dataset is not None and not force
+            with perf_stage("ingest.load", "ingest"):
+                df, report, sources = load_data(self.path, fresh=fresh, progress=progress)
+                deltas = ([], sources) if fresh else read_deltas(self.path, sources)
+                if deltas is None:
+                    # The snapshot trails rewritten sources; no delta applies
+                    df, report, sources = load_data(self.path, fresh=True, progress=progress)
+                    deltas = ([], sources)
+            loaded = merge_delta(SalesDataset(df, version, sources, report), *deltas)
+            if loaded.version != version:
+                write_snapshot(loaded.df, loaded.schema_report, loaded.sources, self.path)
+            self.current = loaded
+            return self.current
+
+
+# ============ PARTITIONED LAYOUT ============ #
+# Year=YYYY/Country=NAME/ Parquet directories, written by the build step
+#   python app.py --build-partitions [directory]
+# The DuckDB backend pointed at them (VELOCIA_PARQUET=partitions) reads only
+# the partitions a Year or Country filter or a calendar range touches.
+PARTITION_DIR = "partitions"
+PARTITION_COLUMNS = ["Year", "Country"]
+
+
+def parquet_files(source):
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "**", "*.parquet"), recursive=True))
+    return sorted(glob.glob(source))
+
+
+def build_partitions(df, root=PARTITION_DIR):
+    # Year follows Date, the same year the filter index and calendar use
+    table = pa.Table.from_pandas(
+        df.assign(Year=df["Date"].dt.year.astype("int16")),
+        preserve_index=False
+    )
+    # Unique names, so leftovers from a crashed build never block this one
+    staging = tempfile.mkdtemp(
+        prefix=os.path.basename(os.path.abspath(root)) + ".tmp-",
+        dir=os.path.dirname(os.path.abspath(root))
+    )
+    pa_ds.write_dataset(
+        table,
+        staging,
+        format="parquet",
+        partitioning=PARTITION_COLUMNS,
+        partitioning_flavor="hive"
+    )
+    # Swap the finished tree in so readers never see a half-written layout
+    retired = staging + ".old"
+    if os.path.exists(root):
+        os.replace(root, retired)
+    os.replace(staging, root)
+    shutil.rmtree(retired, ignore_errors=True)
+    return len(parquet_files(root))
+
+# ============ QUERY BACKEND ============ #
+# "pandas" keeps the whole frame in memory and suits small data. "duckdb" keeps
+# the rows in a local DuckDB database, or reads Parquet files in place, and runs
+# the same filters and groupbys as SQL so histories larger than RAM still load.
+QUERY_BACKEND = os.environ.get("VELOCIA_BACKEND", "pandas")
+# File, directory or glob of Parquet files; Sales.csv is ingested when unset
+PARQUET_SOURCE = os.environ.get("VELOCIA_PARQUET")
+DUCKDB_PATH = os.path.join(SNAPSHOT_DIR, "sales.duckdb")
+
+
+def sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def csv_ingest_sql(path, table):
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    money_cols = [col for col in MONEY_COLUMNS if col in columns]
+    # Same rules as normalize_currency: the first symbol-bearing amount wins
+    currency = " ".join(
+        f'WHEN contains("{col}", {sql_string(symbol)}) THEN {sql_string(code)}'
+        for col in money_cols
+        for symbol, code in reversed(CURRENCY_SYMBOLS.items())
+    )
+    select = []
+    for col in columns:
+        if col == "Date":
+            select.append('TRY_CAST("Date" AS TIMESTAMP) AS "Date"')
+        elif col in money_cols:
+            select.append(
+                f"TRY_CAST(regexp_replace(\"{col}\", '[^0-9.\\-]', '', 'g') AS DOUBLE) AS \"{col}\""
+            )
+        else:
+            select.append(f'"{col}"')
+    select.append(f"CASE {currency} ELSE {sql_string(BASE_CURRENCY)} END AS Currency")
+    files = ", ".join(sql_string(source) for source in source_paths(path))
+    types = ", ".join(f"{sql_string(col)}: 'VARCHAR'" for col in ["Date"] + money_cols)
+    return (
+        f"CREATE TABLE {table} AS SELECT {', '.join(select)} "
+        f"FROM read_csv([{files}], header = true, union_by_name = true, types = {{{types}}}) "
+        f'WHERE TRY_CAST("Date" AS TIMESTAMP) IS NOT NULL ORDER BY "Date"'
+    )
+
+
+class SqlDataset:
+    backend = "duckdb"
+
+    def __init__(self, con, table, version, signature, partitioned=False):
+        self.con = con
+        self.table = table
+        self.partitioned = partitioned
+        self.version = version
+        self.signature = signature
+        self.df = None
+        self.schema_report = []
+        # A unique key orders ties and dedupes samples: rowid for tables, the
+        # file and row position for Parquet views (hidden from pages)
+        if "file_row_number" in self.query(f"SELECT * FROM {table} LIMIT 0").columns:
+            self.key_columns = ["filename", "file_row_number"]
+            self.star = "* EXCLUDE (filename, file_row_number)"
+        else:
+            self.key_columns = ["rowid"]
+            self.star = "*"
+        self.template = self.query(f"SELECT {self.star} FROM {table} LIMIT 0")
+        self.rows = int(self.query(f"SELECT count(*) AS n FROM {table}")["n"].iloc[0])
+        self.cube = self.build_cube()
+        self.calendar = self.build_calendar()
+
+    def __len__(self):
+        return self.rows
+
+    def query(self, sql, params=None):
+        # A cursor per query, so concurrent sessions never share one connection
+        cursor = self.con.cursor()
+        try:
+            frame = cursor.execute(sql, params or []).df()
+        finally:
+            cursor.close()
+        for col in CATEGORY_COLUMNS:
+            if col in frame.columns:
+                frame[col] = frame[col].astype("category")
+        return frame
+
+    def measures(self):
+        return [
+            (name, col) for name, col in [
+                ("Revenue", detect_column(self.template, ["revenue", "sales", "amount"])),
+                ("Profit", detect_column(self.template, ["profit"])),
+                ("Quantity", detect_column(self.template, ["quantity"])),
+            ] if col
+        ]
+
+    def build_cube(self):
+        measures = dict(self.measures())
+        dims = [f'"{col}"' for col in CUBE_DIMENSIONS if col in self.template.columns]
+        quantity = f', CAST(sum("{measures["Quantity"]}") AS BIGINT) AS Quantity' if "Quantity" in measures else ""
+        cube = self.query(
+            f"SELECT CAST(date_trunc('month', \"Date\") AS TIMESTAMP) AS Month, {', '.join(dims)}, "
+            f'sum("{measures["Revenue"]}") AS Revenue, sum("{measures["Profit"]}") AS Profit, '
+            f"count(*) AS Orders{quantity} FROM {self.table} "
+            f'WHERE "{measures["Revenue"]}" IS NOT NULL AND "{measures["Profit"]}" IS NOT NULL '
+            "GROUP BY ALL ORDER BY ALL"
+        )
+        cube["Year"] = cube["Month"].dt.year
+        return cube
+
+    def build_calendar(self):
+        measures = self.measures()
+        sums = "".join(f', coalesce(sum("{col}"), 0) AS {name}' for name, col in measures)
+        daily = self.query(
+            f'SELECT CAST("Date" AS DATE) AS Day, Currency, count(*) AS Orders{sums} '
+            f"FROM {self.table} GROUP BY ALL ORDER BY Day"
+        )
+        days, at = np.unique(daily["Day"].to_numpy().astype("datetime64[D]"), return_inverse=True)
+        currencies = list(daily["Currency"].cat.categories)
+        rows = daily["Currency"].cat.codes.to_numpy()
+        counts = np.bincount(at, weights=daily["Orders"].to_numpy(), minlength=len(days))
+        prefix = {}
+        for name, _ in measures:
+            values = np.zeros((len(currencies), len(days)))
+            np.add.at(values, (rows, at), daily[name].to_numpy(dtype="float64"))
+            prefix[name] = np.concatenate([np.zeros((len(currencies), 1)), values.cumsum(axis=1)], axis=1)
+        return {
+            "days": days,
+            "offsets": np.append(0, counts.cumsum()).astype(np.int64),
+            "currencies": currencies,
+            "prefix": prefix,
+        }
+
+    def where(self, **selection):
+        where = []
+        params = []
+        for dim, value in selection.items():
+            if not isinstance(value, list) and value == "All":
+                continue
+            values = value if isinstance(value, list) else [value]
+            if not values:
+                where.append("FALSE")
+                continue
+            # Partition columns let DuckDB skip whole directories
+            if dim == "Year":
+                column = '"Year"' if self.partitioned else 'year("Date")'
+            else:
+                column = f'"{dim}"'
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(int(v) if dim == "Year" else str(v) for v in values)
+        return (f" WHERE {' AND '.join(where)}" if where else ""), params
+
+    def select(self, columns, **selection):
+        clause, params = self.where(**selection)
+        cols = ", ".join(f'"{col}"' for col in columns)
+        return self.query(f"SELECT {cols} FROM {self.table}{clause}", params)
+
+    def currency_factor(self, currency):
+        factors = currency_factors(self.calendar["currencies"], currency)
+        cases = " ".join(
+            f"WHEN {sql_string(code)} THEN {float(factor)!r}::DOUBLE"
+            for code, factor in zip(self.calendar["currencies"], factors) if np.isfinite(factor)
+        )
+        return f"CASE Currency {cases} END" if cases else "NULL"
+
+    # Same points as scatter_points over select(), but counted, sampled and
+    # binned inside DuckDB: only the reduced points ever reach pandas
+    def scatter_points(self, x, y, currency, settings, **selection):
+        webgl_rows, reduce_rows, sample_size, method = settings
+        clause, params = self.where(**selection)
+        factor = self.currency_factor(currency)
+        keys = ", ".join(self.key_columns)
+        rows = (
+            f'SELECT * FROM (SELECT {keys}, CAST("{x}" AS DOUBLE) * {factor} AS x, CAST("{y}" AS DOUBLE) * {factor} AS y, Country '
+            f"FROM {self.table}{clause}) WHERE x IS NOT NULL AND y IS NOT NULL"
+        )
+        q = SCATTER_OUTLIER_QUANTILE
+        stats = self.query(
+            f"SELECT count(*) AS n, approx_quantile(x, [{q}, 0.5, {1 - q}]) AS qx, "
+            f"approx_quantile(y, [{q}, 0.5, {1 - q}]) AS qy, "
+            f"min(x) AS x_min, max(x) AS x_max, min(y) AS y_min, max(y) AS y_max FROM ({rows})",
+            params
+        ).iloc[0]
+        total = int(stats["n"])
+
+        def finish(frame, density=None):
+            frame = frame.drop_duplicates(subset=self.key_columns).drop(columns=self.key_columns)
+            return {
+                "total": total,
+                "mode": "webgl" if total > webgl_rows else "svg",
+                "rows": frame.rename(columns={"x": x, "y": y}).reset_index(drop=True),
+                "density": density,
+            }
+
+        if total <= reduce_rows:
+            return finish(self.query(rows, params))
+
+        # The rows farthest from the median, as in outlier_positions
+        (x_low, x_mid, x_high), (y_low, y_mid, y_high) = stats["qx"], stats["qy"]
+        limit = max(1, int(sample_size * SCATTER_OUTLIER_SHARE))
+        outliers = self.query(
+            f"SELECT * FROM ({rows}) WHERE x < ? OR x > ? OR y < ? OR y > ? "
+            "ORDER BY greatest(abs(x - ?) / ?, abs(y - ?) / ?) DESC LIMIT ?",
+            params + [x_low, x_high, y_low, y_high, x_mid, (x_high - x_low) or 1.0, y_mid, (y_high - y_low) or 1.0, limit]
+        )
+        if method == "Density bins":
+            bins = SCATTER_DENSITY_BINS
+            x_width = (stats["x_max"] - stats["x_min"]) / bins or 1.0
+            y_width = (stats["y_max"] - stats["y_min"]) / bins or 1.0
+            cells = self.query(
+                f"SELECT least({bins - 1}, CAST(floor((x - ?) / ?) AS INTEGER)) AS i, "
+                f"least({bins - 1}, CAST(floor((y - ?) / ?) AS INTEGER)) AS j, count(*) AS n "
+                f"FROM ({rows}) GROUP BY ALL",
+                [stats["x_min"], x_width, stats["y_min"], y_width] + params
+            )
+            counts = np.zeros((bins, bins))
+            counts[cells["i"].to_numpy(), cells["j"].to_numpy()] = cells["n"].to_numpy()
+            x_edges = stats["x_min"] + x_width * np.arange(bins + 1)
+            y_edges = stats["y_min"] + y_width * np.arange(bins + 1)
+            return finish(outliers, {
+                "x": (x_edges[:-1] + x_edges[1:]) / 2,
+                "y": (y_edges[:-1] + y_edges[1:]) / 2,
+                "z": np.where(counts.T > 0, counts.T, np.nan),
+            })
+
+        # One reservoir sample per country, sized like stratified_positions
+        groups = self.query(f"SELECT Country, count(*) AS n FROM ({rows}) GROUP BY ALL", params)
+        budget = sample_size - len(outliers)
+        parts, part_params = [], []
+        for country, count in zip(groups["Country"].astype(object), groups["n"]):
+            take = min(int(count), max(SCATTER_MIN_PER_GROUP, int(count * budget / total)))
+            parts.append(
+                f"SELECT * FROM (SELECT * FROM ({rows}) WHERE Country IS NOT DISTINCT FROM ?) "
+                f"USING SAMPLE reservoir({take} ROWS) REPEATABLE (0)"
+            )
+            part_params += params + [None if pd.isna(country) else str(country)]
+        sample = self.query(" UNION ALL ".join(parts), part_params) if parts else outliers.iloc[:0]
+        return finish(pd.concat([sample, outliers], ignore_index=True))
+
+    def date_rows(self, start, stop):
+        if stop <= start:
+            return self.template
+        # Only the days holding these rows are read, in a fixed order; the
+        # offset is relative to the first row of the first day
+        days = self.calendar["days"]
+        offsets = self.calendar["offsets"]
+        first = np.searchsorted(offsets, start, side="right") - 1
+        last = np.searchsorted(offsets, stop - 1, side="right") - 1
+        where = '"Date" >= ? AND "Date" < ?'
+        params = [pd.Timestamp(days[first]).to_pydatetime(), pd.Timestamp(days[last] + 1).to_pydatetime()]
+        if self.partitioned:
+            # Partition columns let DuckDB skip whole year directories
+            where += ' AND "Year" BETWEEN ? AND ?'
+            params += [pd.Timestamp(days[first]).year, pd.Timestamp(days[last]).year]
+        keys = ", ".join(self.key_columns)
+        return self.query(
+            f'SELECT {self.star} FROM {self.table} WHERE {where} ORDER BY "Date", {keys} LIMIT ? OFFSET ?',
+            params + [int(stop - start), int(start - offsets[first])]
+        )
+
+
+class DuckDBStore:
+    def __init__(self, path, parquet=None):
+        self.path = path
+        self.parquet = parquet
+        self.lock = threading.Lock()
+        self.current = None
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        self.con = duckdb.connect(DUCKDB_PATH)
+        self.worker = RefreshWorker(self)
+
+    def signature(self):
+        if self.parquet:
+            return {source: source_signature(source) for source in parquet_files(self.parquet)}
+        return sources_signature(self.path)
+
+    def get(self, progress=None):
+        dataset = self.current
+        if dataset is None:
+            return self.reload()
+        if dataset.signature != self.signature():
+            self.worker.request()
+        return dataset
+
+    def reload(self, force=False, progress=None):
+        with self.lock:
+            dataset = self.current
+            signature = self.signature()
+            if dataset is not None and dataset.signature == signature and not force:
+                return dataset
+            version = dataset.version + 1 if dataset else 1
+            with perf_stage("ingest.load", "ingest"):
+                table = self.build_table(signature, force)
+            self.current = SqlDataset(self.con, table, version, signature, self.partitioned())
+            return self.current
+
+    def partitioned(self):
+        return bool(self.parquet) and os.path.isdir(self.parquet) and any(
+            name.startswith(f"{PARTITION_COLUMNS[0]}=") for name in os.listdir(self.parquet)
+        )
+
+    def build_table(self, signature, force=False):
+        if self.parquet:
+            source = os.path.join(self.parquet, "**", "*.parquet") if os.path.isdir(self.parquet) else self.parquet
+            self.con.execute(
+                f"CREATE OR REPLACE VIEW sales AS SELECT * FROM read_parquet("
+                f"{sql_string(source)}, hive_partitioning = true, union_by_name = true, "
+                f"filename = true, file_row_number = true)"
+            )
+            return "sales"
+
+        meta_path = DUCKDB_PATH + ".json"
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        tables = {
+            name for (name,) in self.con.execute(
+                "SELECT table_name FROM information_schema.tables WHERE table_name LIKE 'sales_%'"
+            ).fetchall()
+        }
+        if (
+            not force
+            and meta.get("format") == SNAPSHOT_FORMAT
+            and meta.get("sources") == signature
+            and meta.get("table") in tables
+        ):
+            return meta["table"]
+
+        # Each build gets a new table; sessions still reading the previous
+        # version keep it until the next build replaces it
+        build = meta.get("build", 0) + 1
+        table = f"sales_{build}"
+        self.con.execute(f"DROP TABLE IF EXISTS {table}")
+        self.con.execute(csv_ingest_sql(self.path, table))
+        for name in tables - {table, meta.get("table")}:
+            self.con.execute(f"DROP TABLE IF EXISTS {name}")
+        with open(meta_path, "w") as f:
+            json.dump({"format": SNAPSHOT_FORMAT, "sources": signature, "table": table, "build": build}, f)
+        return table
+
+# ============ SCATTER REDUCTION ============ #
+# Small selections are drawn as-is, mid-size ones switch to WebGL traces and
+# large ones are reduced server-side before anything is sent to the browser.
+SCATTER_WEBGL_ROWS = 5_000
+SCATTER_REDUCE_ROWS = 50_000
+SCATTER_SAMPLE_SIZE = 20_000
+SCATTER_METHODS = ["Stratified sample", "Density bins"]
+SCATTER_MIN_PER_GROUP = 200
+SCATTER_OUTLIER_QUANTILE = 0.001
+# Share of the point budget kept for the most extreme rows
+SCATTER_OUTLIER_SHARE = 0.05
+SCATTER_DENSITY_BINS = 80
+
+
+def outlier_positions(rows, cols, limit):
+    mask = np.zeros(len(rows), dtype=bool)
+    distance = np.zeros(len(rows))
+    for col in cols:
+        values = rows[col].to_numpy(dtype="float64")
+        low, median, high = np.nanquantile(values, [SCATTER_OUTLIER_QUANTILE, 0.5, 1 - SCATTER_OUTLIER_QUANTILE])
+        mask |= (values < low) | (values > high)
+        # Measured against each column's own spread so both axes compare
+        distance = np.fmax(distance, np.abs(values - median) / ((high - low) or 1.0))
+    positions = np.flatnonzero(mask)
+    if len(positions) > limit:
+        # Only the rows farthest from the median, so the count stays fixed
+        positions = np.sort(positions[np.argpartition(-distance[positions], limit - 1)[:limit]])
+    return positions
+
+
+def stratified_positions(rows, by, size):
+    rng = np.random.default_rng(0)
+    codes = pd.factorize(rows[by])[0]
+    keep = []
+    for code in np.unique(codes):
+        members = np.flatnonzero(codes == code)
+        take = max(SCATTER_MIN_PER_GROUP, int(len(members) * size / len(rows)))
+        keep.append(rng.choice(members, size=min(take, len(members)), replace=False))
+    return np.concatenate(keep) if keep else np.empty(0, dtype=np.int64)
+
+
+def scatter_points(rows, x, y, settings):
+    webgl_rows, reduce_rows, sample_size, method = settings
+    points = {"total": len(rows), "mode": "svg", "rows": rows, "density": None}
+    if len(rows) > webgl_rows:
+        points["mode"] = "webgl"
+    if len(rows) <= reduce_rows:
+        return points
+
+    # The most extreme rows survive every reduction so anomalies stay visible;
+    # they take their share of the point budget, not points on top of it
+    outliers = outlier_positions(rows, [x, y], max(1, int(sample_size * SCATTER_OUTLIER_SHARE)))
+    if method == "Density bins":
+        counts, x_edges, y_edges = np.histogram2d(
+            rows[x].to_numpy(dtype="float64"),
+            rows[y].to_numpy(dtype="float64"),
+            bins=SCATTER_DENSITY_BINS
+        )
+        points["density"] = {
+            "x": (x_edges[:-1] + x_edges[1:]) / 2,
+            "y": (y_edges[:-1] + y_edges[1:]) / 2,
+            "z": np.where(counts.T > 0, counts.T, np.nan),
+        }
+        keep = outliers
+    else:
+        keep = np.union1d(stratified_positions(rows, "Country", sample_size - len(outliers)), outliers)
+    points["rows"] = rows.iloc[keep]
+    return points
+
+# ============ PAGE RESULTS ============ #
+def home_results(dataset, currency):
+    cube = to_reporting_currency(dataset.cube, currency)
+
+    total_revenue = cube["Revenue"].sum()
+    total_orders = cube["Orders"].sum()
+    trend = cube.groupby("Month")["Revenue"].sum().reset_index()
+    trend["Date"] = trend["Month"].dt.strftime("%Y-%m")
+
+    return {
+        "total_revenue": total_revenue,
+        "total_profit": cube["Profit"].sum(),
+        "total_orders": total_orders,
+        "aov": total_revenue / total_orders if total_orders else 0,
+        "total_country": cube["Country"].nunique(),
+        "trend": trend,
+        "age_df": cube.groupby("Age_Group", observed=True)["Revenue"].sum().reset_index(),
+        "cat_df": cube.groupby("Product_Category", observed=True)["Revenue"].sum().reset_index(),
+        "map_df": cube.groupby("Country", observed=True)["Revenue"].sum().reset_index(),
+    }
+
+
+def dashboard_results(dataset, country, product, year, compare_mode, currency):
+    winner = None
+    loser = None
+    delta_value = 0
+    delta_text = None
+    view = to_reporting_currency(
+        slice_cube(dataset.cube, country, product, year),
+        currency
+    ).dropna(subset=["Revenue", "Profit"])
+
+# ============ KPI CALCULATION ============ #
+    total_revenue = view["Revenue"].sum()
+    total_profit = view["Profit"].sum()
+    total_orders = view["Orders"].sum()
+    aov = total_revenue / total_orders if total_orders > 0 else 0
+
+# ============ WINNER / LOSER LOGIC ============ #
+    if compare_mode and view["Country"].nunique() >= 2:
+        country_rev = (
+            view
+            .groupby("Country", observed=True)["Revenue"]
+            .sum()
+            .sort_values(ascending=False)
+        )
+        winner = country_rev.index[0]
+        loser = country_rev.index[-1]
+        top_val = country_rev.iloc[0]
+        loser_val = country_rev.iloc[-1]
+        if loser_val > 0:
+            delta_value = ((top_val - loser_val) / loser_val) * 100
+            delta_text = f"{winner} outperform {loser} by {delta_value:.1f}%"
+
+# ============ CHART DATA ============ #
+    trend = (
+        view
+        .groupby(["Month", "Country"], observed=True)["Revenue"]
+        .sum()
+        .reset_index()
+    )
+    trend["Date"] = trend["Month"].dt.strftime("%Y-%m")
+
+    age_df = (
+        view
+        .groupby("Age_Group", observed=True)["Revenue"]
+        .sum()
+        .reset_index()
+        .sort_values("Revenue", ascending=False)
+    )
+
+    category_df = (
+        view
+        .groupby("Product_Category", observed=True)["Revenue"]
+        .sum()
+        .reset_index()
+    )
+
+    map_df = (
+        view
+        .groupby("Country", observed=True)["Revenue"]
+        .sum()
+        .reset_index()
+    )
+
+# ============ TOP PRODUCT ============ #
+    top_product = "N/A"
+
+    if not view.empty:
+        prod_rev = (
+            view
+            .groupby("Product", observed=True)["Revenue"]
+            .sum()
+            .sort_values(ascending=False)
+        )
+
+        if not prod_rev.empty:
+            top_product = prod_rev.index[0]
+
+# ============ INSIGHT CALCULATION ============ #
+    # Top Country
+    top_country = winner if winner else "N/A"
+    # Top Age Group
+    top_age = "N/A"
+    top_age_val = 0
+    if not age_df.empty:
+        top_age = age_df.iloc[0]["Age_Group"]
+        top_age_val = age_df.iloc[0]["Revenue"]
+    # Top Product Category
+    top_category = "N/A"
+    top_category_val = 0
+    if not category_df.empty:
+        top_category = (
+            category_df
+            .sort_values("Revenue", ascending=False)
+            .iloc[0]["Product_Category"]
+        )
+        top_category_val = (
+            category_df
+            .sort_values("Revenue", ascending=False)
+            .iloc[0]["Revenue"]
+        )
+    # Trend Insight
+    trend_msg = "Revenue remains relatively stable over time."
+    if len(trend["Date"].unique()) > 3:
+        trend_msg = (
+            "Revenue exhibits noticeable monthly fluctuations, "
+            "indicating the presence of seasonal demand patterns."
+        )
+
+    return {
+        "total_revenue": total_revenue,
+        "total_profit": total_profit,
+        "total_orders": total_orders,
+        "aov": aov,
+        "winner": winner,
+        "loser": loser,
+        "delta_value": delta_value,
+        "delta_text": delta_text,
+        "trend": trend,
+        "age_df": age_df,
+        "category_df": category_df,
+        "map_df": map_df,
+        "top_product": top_product,
+        "top_country": top_country,
+        "top_age": top_age,
+        "top_age_val": top_age_val,
+        "top_category": top_category,
+        "top_category_val": top_category_val,
+        "trend_msg": trend_msg,
+    }
+
+# ============ DOCUMENT TABLE ============ #
+# Sorting, filtering and search run against the shared frame on the server;
+# only the visible page of rows is ever materialized and sent to the browser.
+def sorted_positions(dataset, column):
+    order = dataset.sort_orders.get(column)
+    if order is None:
+        values = dataset.df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Categories are created sorted, so code order is label order
+            values = values.cat.codes
+        order = np.argsort(values.to_numpy(), kind="stable").astype(np.int32)
+        dataset.sort_orders[column] = order
+    return order
+
+
+def search_mask(df, text):
+    text = text.lower()
+    mask = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Match against the few category labels, then broadcast by code
+            hits = values.cat.categories.str.lower().str.contains(text, regex=False)
+            mask |= np.append(hits, False)[values.cat.codes.to_numpy()]
+        elif pd.api.types.is_string_dtype(values) or values.dtype == object:
+            mask |= values.astype(str).str.lower().str.contains(text, regex=False).to_numpy()
+    return mask
+
+
+def column_mask(df, column, condition):
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.isin(condition).to_numpy()
+    low, high = condition
+    return ((values >= low) & (values <= high)).to_numpy()
+
+
+def table_positions(dataset, sort_col, ascending, filter_col, condition, search):
+    order = sorted_positions(dataset, sort_col) if sort_col else None
+    if order is not None and not ascending:
+        order = order[::-1]
+
+    mask = None
+    if filter_col and condition is not None:
+        mask = column_mask(dataset.df, filter_col, condition)
+    if search:
+        found = search_mask(dataset.df, search)
+        mask = found if mask is None else mask & found
+
+    if mask is None:
+        return order
+    if order is None:
+        return np.flatnonzero(mask).astype(np.int32)
+    return order[mask[order]]
+
+# ============ EXPORT ============ #
+# Exports are generated only when the download is clicked, written chunk by
+# chunk into a temporary file rather than built as one in-memory string.
+EXPORT_CHUNK_ROWS = 250_000
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def export_chunks(df, positions):
+    total = len(df) if positions is None else len(positions)
+    # An empty selection still yields one empty chunk so the header is written
+    for start in range(0, max(total, 1), EXPORT_CHUNK_ROWS):
+        stop = start + EXPORT_CHUNK_ROWS
+        yield df.iloc[start:stop] if positions is None else df.iloc[positions[start:stop]]
+
+
+def write_export(df, positions, fmt):
+    out = tempfile.TemporaryFile()
+    if fmt == "Parquet":
+        writer = None
+        for chunk in export_chunks(df, positions):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+        writer.close()
+    else:
+        stream = gzip.GzipFile(fileobj=out, mode="wb") if fmt == "CSV (gzip)" else out
+        text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        for i, chunk in enumerate(export_chunks(df, positions)):
+            chunk.to_csv(text, index=False, header=i == 0)
+        text.flush()
+        text.detach()
+        if stream is not out:
+            stream.close()
+    out.seek(0)
+    return out
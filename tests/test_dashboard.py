@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+import sales_engine
+
+
+def run_page(page):
+    os.chdir(ROOT)
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    at.session_state["page"] = page
+    at.run()
+    return at
+
+
+def test_select_rows_empty_selection():
+    df = pd.DataFrame({
+        "Date": pd.to_datetime(["2015-01-01", "2015-06-01", "2016-01-01"]),
+        "Country": pd.Categorical(["France", "Germany", "France"]),
+        "Product": pd.Categorical(["A", "B", "A"]),
+    })
+    index = sales_engine.build_filter_index(df)
+    assert sales_engine.select_rows(index, Country=[]).tolist() == []
+    assert sales_engine.select_rows(index, Country=[], Year=[2015]).tolist() == []
+    assert sales_engine.select_rows(index, Country=["France", "Germany"], Year=[]).dtype == np.int32
+    assert sales_engine.select_rows(index, Country=["France"], Year=[2015]).tolist() == [0]
+
+
+def test_comparison_mode_cleared_multiselect():
+    at = run_page("Dashboard")
+    at.toggle[0].set_value(True).run()
+    assert not at.exception
+    for label in ["Country", "Product", "Year"]:
+        widget = next(item for item in at.multiselect if item.label == label)
+        widget.set_value([]).run()
+        assert not at.exception, label
@@ -0,0 +1,133 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sales_engine
+# Synthetic rows with the same columns and dirty values as Sales.csv
+from benchmark import product_table, synthetic_chunk
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sales_engine, "SNAPSHOT_DIR", str(tmp_path / ".cache"))
+
+
+def write_rows(path, rows, seed, append=False, date=None):
+    chunk = synthetic_chunk(rows, np.random.default_rng(seed), product_table())
+    if date is not None:
+        chunk["Date"] = date
+    chunk.to_csv(path, mode="a" if append else "w", header=not append, index=False)
+    return int(pd.to_datetime(chunk["Date"], errors="coerce").notna().sum())
+
+
+def append_after_state(monkeypatch, rows):
+    full_state = sales_engine.full_state
+
+    # A POS export appending while the cold parse runs
+    def racing_state(source):
+        state = full_state(source)
+        write_rows(source, rows, 1, append=True)
+        return state
+    monkeypatch.setattr(sales_engine, "full_state", racing_state)
+
+
+@pytest.mark.parametrize("reader", ["arrow", "pandas"])
+def test_parse_stops_at_recorded_offset(tmp_path, monkeypatch, reader):
+    path = str(tmp_path / "Sales.csv")
+    valid = write_rows(path, 2_000, 0)
+    append_after_state(monkeypatch, 50)
+
+    df, _, sources = sales_engine.parse_sales_csv(path, reader=reader)
+    assert len(df) == valid
+    assert sources[path]["offset"] < os.path.getsize(path)
+
+
+def test_append_during_parse_is_read_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "Sales.csv")
+    write_rows(path, 2_000, 0)
+    append_after_state(monkeypatch, 50)
+
+    dataset = sales_engine.DatasetStore(path).get()
+    valid = int(pd.to_datetime(pd.read_csv(path)["Date"], errors="coerce").notna().sum())
+    assert valid > 2_000
+    assert len(dataset) == valid
+    assert dataset.cube["Orders"].sum() == valid
+    assert dataset.calendar["offsets"][-1] == valid
+
+
+def assert_same_dataset(merged, fresh):
+    pd.testing.assert_frame_equal(merged.df, fresh.df)
+    keys = ["Month"] + [col for col in sales_engine.CUBE_DIMENSIONS if col in fresh.cube.columns]
+    pd.testing.assert_frame_equal(
+        merged.cube.sort_values(keys).reset_index(drop=True),
+        fresh.cube.sort_values(keys).reset_index(drop=True),
+        check_categorical=False
+    )
+    assert np.array_equal(merged.calendar["days"], fresh.calendar["days"])
+    assert np.array_equal(merged.calendar["offsets"], fresh.calendar["offsets"])
+    assert merged.calendar["currencies"] == fresh.calendar["currencies"]
+    for name, prefix in fresh.calendar["prefix"].items():
+        assert np.allclose(merged.calendar["prefix"][name], prefix)
+    for dim, positions in fresh.filter_index.items():
+        assert set(merged.filter_index[dim]) == set(positions)
+        for label, rows in positions.items():
+            assert np.array_equal(merged.filter_index[dim][label], rows), (dim, label)
+
+
+@pytest.mark.parametrize("date", [None, "2017-01-15"], ids=["back-dated", "in-order"])
+def test_incremental_merge_matches_fresh_load(tmp_path, date):
+    path = str(tmp_path / "Sales.csv")
+    write_rows(path, 3_000, 0)
+    store = sales_engine.DatasetStore(path)
+    store.get()
+
+    write_rows(path, 400, 1, append=True, date=date)
+    write_rows(str(tmp_path / "Sales_2017-01-16.csv"), 300, 2, date=date)
+    merged = store.reload()
+    assert merged.version == 2
+
+    df, report, sources = sales_engine.load_data(path, fresh=True)
+    assert_same_dataset(merged, sales_engine.SalesDataset(df, 1, sources, report))
+
+
+def test_cube_keeps_rows_missing_a_dimension(tmp_path):
+    path = str(tmp_path / "Sales.csv")
+    chunk = synthetic_chunk(1_000, np.random.default_rng(0), product_table())
+    chunk.loc[::3, "Age_Group"] = np.nan
+    chunk.loc[1::5, "Product"] = np.nan
+    chunk.to_csv(path, index=False)
+
+    dataset = sales_engine.DatasetStore(path).get()
+    assert dataset.df["Age_Group"].isna().any()
+    assert dataset.cube["Orders"].sum() == len(dataset)
+    assert np.isclose(dataset.cube["Revenue"].sum(), dataset.df["Revenue"].sum())
+
+
+def test_rewrite_reloads_with_one_fresh_parse(tmp_path, monkeypatch):
+    path = str(tmp_path / "Sales.csv")
+    write_rows(path, 2_000, 0)
+    store = sales_engine.DatasetStore(path)
+    store.get()
+
+    calls = []
+
+    def counted(name):
+        original = getattr(sales_engine, name)
+
+        def call(*args, **kwargs):
+            calls.append(name)
+            return original(*args, **kwargs)
+        monkeypatch.setattr(sales_engine, name, call)
+    counted("read_snapshot")
+    counted("parse_sales_csv")
+    valid = write_rows(path, 1_500, 3)
+    dataset = store.reload()
+    assert calls == ["parse_sales_csv"]
+    assert len(dataset) == valid
+    assert dataset.version == 2